@@ -4,10 +4,10 @@ import json
 from datetime import datetime
 import threading
 import pika
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-from config import RESERVATION_QUEUES, ITINERARIES_FILE, ITINERARY_TEMPLATE, RESERVATION_CREATED_QUEUE, PAYMENT_PUBLIC_KEY_FILE, PAYMENT_APPROVED_QUEUE, PAYMENT_DECLINED_QUEUE, TICKET_ISSUED_QUEUE, PAYMENT_EXCHANGE, TICKET_EXCHANGE
-from utils import is_valid_date, load_itineraries, create_channel, verify_signature
+from config import RESERVATION_QUEUES, ITINERARIES_FILE, ITINERARY_TEMPLATE, RESERVATION_CREATED_QUEUE, PAYMENT_APPROVED_QUEUE, PAYMENT_DECLINED_QUEUE, TICKET_ISSUED_QUEUE, PAYMENT_EXCHANGE, TICKET_EXCHANGE
+from utils import is_valid_date, load_itineraries, create_channel
+from codec import decode_message
+from verification import BatchVerifier, verify_payment_message
 
 ch = create_channel()
 ch.queue_declare(queue=RESERVATION_CREATED_QUEUE)
@@ -48,23 +48,20 @@ def get_filtered_itineraries(destination, boarding_date, boarding_port):
 
 def consume_queues(root):
     ch = create_channel()
+    verifier = BatchVerifier(ch.connection)
 
     for queue in RESERVATION_QUEUES:
         ch.queue_declare(queue=queue)
 
     def callback_approved(ch, method, properties, body):
-        print("[Reservation] Payment approved.")
-        msg = json.loads(body)
-        if verify_signature(msg["message"], msg["signature"], PAYMENT_PUBLIC_KEY_FILE):
-            print("[Reservation] Payment approved:", msg["message"])
-            messagebox.showinfo("Success", "Payment approved. Proceeding to issue ticket.")
+        msg = decode_message(properties, body)
+        print("[Reservation] Payment approved:", msg["message"])
+        messagebox.showinfo("Success", "Payment approved. Proceeding to issue ticket.")
 
     def callback_declined(ch, method, properties, body):
-        print("[Reservation] Payment declined.")
-        msg = json.loads(body)
-        if verify_signature(msg["message"], msg["signature"], PAYMENT_PUBLIC_KEY_FILE):
-            print("[Reservation] Payment declined:", msg["message"])
-            messagebox.showerror("Error", "Payment declined. Reservation canceled.")
+        msg = decode_message(properties, body)
+        print("[Reservation] Payment declined:", msg["message"])
+        messagebox.showerror("Error", "Payment declined. Reservation canceled.")
 
     def callback_ticket(ch, method, properties, body):
         print("[Reservation] Ticket issued.")
@@ -73,11 +70,11 @@ def consume_queues(root):
    
     queue_approved = ch.queue_declare(queue='', exclusive=True).method.queue
     ch.queue_bind(exchange=PAYMENT_EXCHANGE, queue=queue_approved, routing_key=PAYMENT_APPROVED_QUEUE)
-    ch.basic_consume(queue=queue_approved, on_message_callback=callback_approved, auto_ack=True)
+    ch.basic_consume(queue=queue_approved, on_message_callback=verifier.wrap(queue_approved, verify_payment_message, callback_approved), auto_ack=False)
     
     queue_denclined = ch.queue_declare(queue='', exclusive=True).method.queue
     ch.queue_bind(exchange=PAYMENT_EXCHANGE, queue=queue_denclined, routing_key=PAYMENT_DECLINED_QUEUE)
-    ch.basic_consume(queue=queue_denclined, on_message_callback=callback_declined, auto_ack=True)
+    ch.basic_consume(queue=queue_denclined, on_message_callback=verifier.wrap(queue_denclined, verify_payment_message, callback_declined), auto_ack=False)
     
     queue_ticket = ch.queue_declare(queue='', exclusive=True).method.queue
     ch.queue_bind(exchange=TICKET_EXCHANGE, queue=queue_ticket, routing_key=TICKET_ISSUED_QUEUE)
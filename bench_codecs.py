@@ -0,0 +1,48 @@
+import os
+import time
+from datetime import datetime
+from codec import CODECS, JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE
+
+ITERATIONS = 20000
+
+# One representative payload per message type; the signature is the size of
+# an RSA-2048 signature, hex-encoded as handlers see it
+MESSAGES = {
+    "reservation.created": {
+        "id": 2210146271821824, "itinerary_id": 3, "passengers": 2, "total_price": 5400.0,
+        "client_id": 42, "timestamp": datetime.now().isoformat(), "status": "pending",
+    },
+    "payment.approved": {
+        "timestamp": datetime.now().isoformat(),
+        "message": "Payment approved for Bahamas on ship OceanX.",
+        "key_id": os.urandom(32).hex(), "algorithm": "RSA-PKCS1v15-SHA256",
+        "signature": os.urandom(256).hex(), "reservation_id": 2210146271821824,
+    },
+    "ticket.issued": {
+        "timestamp": datetime.now().isoformat(), "status": "Ticket Issued",
+        "details": "Payment approved for Bahamas on ship OceanX.", "reservation_id": 2210146271821824,
+    },
+    "inventory.changed": {"itinerary_id": 3, "available_cabins": 118, "inventory_version": 52311},
+}
+
+def _per_op_us(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def benchmark(codec, data, iterations=ITERATIONS):
+    body = codec.encode(data)
+    assert codec.decode(body) == data
+    return len(body), _per_op_us(lambda: codec.encode(data), iterations), _per_op_us(lambda: codec.decode(body), iterations)
+
+if __name__ == '__main__':
+    if MSGPACK_CONTENT_TYPE not in CODECS:
+        print("msgpack is not installed (pip install msgpack): only JSON is measured.\n")
+    print(f"{'message type':<20}{'content type':<22}{'bytes':>7}{'encode us':>11}{'decode us':>11}")
+    for message_type, data in MESSAGES.items():
+        for content_type in (JSON_CONTENT_TYPE, MSGPACK_CONTENT_TYPE):
+            if content_type not in CODECS:
+                continue
+            size, encode_us, decode_us = benchmark(CODECS[content_type], data)
+            print(f"{message_type:<20}{content_type:<22}{size:>7}{encode_us:>11.2f}{decode_us:>11.2f}")
@@ -0,0 +1,93 @@
+import threading
+import time
+from inventory import CabinInventory
+from itinerary_index import ItineraryIndex, IndexUpdater
+from request_dto import Itinerary
+
+THREADS = 16
+RESERVATIONS_PER_THREAD = 20000
+SAILINGS = 64
+# How the search index follows cabin counts: not at all, inside reserve()
+# (the old on_change), or through the Itinerary MS's IndexUpdater
+INDEX_MODES = ("none", "inline", "updater")
+
+def make_itineraries(count, cabins):
+    return {
+        id: {
+            "id": id, "destination": f"Destination {id % 8}", "departurePort": f"Port {id % 4}",
+            "departure": f"2025-{id % 12 + 1:02d}-{id % 28 + 1:02d}", "price": 1000 + id * 10, "nights": id % 14 + 1,
+            "total_cabins": cabins, "available_cabins": cabins
+        }
+        for id in range(1, count + 1)
+    }
+
+def run(stripes, same_sailing, index_mode):
+    sailings = 1 if same_sailing else SAILINGS
+    cabins = THREADS * RESERVATIONS_PER_THREAD // sailings // 2
+    itineraries = make_itineraries(sailings, cabins)
+    index = ItineraryIndex(itineraries)
+    updater = IndexUpdater(index) if index_mode == "updater" else None
+    version = [0]
+    version_lock = threading.Lock()
+
+    def updater_changed(itinerary_id):
+        # As the Itinerary MS's on_change: bump the cache version, then hand the id to the updater
+        with version_lock:
+            version[0] += 1
+        updater.changed(itinerary_id)
+
+    on_change = {"none": None, "inline": index.update_availability, "updater": updater_changed}[index_mode]
+    inventory = CabinInventory(itineraries, stripes=stripes, on_change=on_change)
+    booked = [0] * THREADS
+    latencies = [[] for _ in range(THREADS)]
+    done = threading.Event()
+
+    def worker(n):
+        clock = time.perf_counter
+        for i in range(RESERVATIONS_PER_THREAD):
+            itinerary_id = 1 if same_sailing else (n + i) % sailings + 1
+            started = clock()
+            if inventory.reserve(itinerary_id, 1) is not None:
+                booked[n] += 1
+            latencies[n].append(clock() - started)
+
+    def searcher():
+        # Searches run alongside bookings, as they do in the service
+        query = Itinerary.from_dict({"sort": "-available_cabins", "limit": "50"})
+        while not done.is_set():
+            index.query(query)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREADS)]
+    search_thread = threading.Thread(target=searcher)
+    search_thread.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    search_thread.join()
+
+    total = sailings * cabins
+    left = sum(itinerary["available_cabins"] for itinerary in itineraries.values())
+    assert sum(booked) == total - left, "booked cabins do not match inventory"
+    assert left == 0, "cabins left over although demand exceeded supply"
+    assert all(itinerary["available_cabins"] >= 0 for itinerary in itineraries.values()), "oversold"
+    if updater:
+        updater.flush()
+    if index_mode != "none":
+        assert not index.available, "index still lists sold-out sailings"
+        assert all(cabins == 0 for cabins, _ in index.sorted["available_cabins"]), "index out of sync with inventory"
+    samples = sorted(latency for thread in latencies for latency in thread)
+    return sum(booked), THREADS * RESERVATIONS_PER_THREAD / elapsed, samples[int(len(samples) * 0.999)] * 1e6
+
+if __name__ == '__main__':
+    print(f"{THREADS} threads x {RESERVATIONS_PER_THREAD} reserve() calls, demand = 2x supply, one search thread")
+    print(f"{'scenario':<18}{'stripes':>8}{'index':>9}{'booked':>10}{'ops/s':>12}{'p99.9 us':>10}")
+    for same_sailing in (True, False):
+        for stripes in (1, 64):
+            for index_mode in INDEX_MODES:
+                booked, rate, p999 = run(stripes, same_sailing, index_mode)
+                scenario = "same sailing" if same_sailing else f"{SAILINGS} sailings"
+                print(f"{scenario:<18}{stripes:>8}{index_mode:>9}{booked:>10}{rate:>12.0f}{p999:>10.0f}")
@@ -0,0 +1,51 @@
+import asyncio
+import statistics
+import sys
+import time
+import httpx
+
+# Compara a latência de /api/reserve/new entre o Reservation MS Flask
+# (reservation.py, porta 5000) e a variante assíncrona (reservation_async.py,
+# porta 5004). Requer os MS Itinerários, Pagamento e Pagamento Externo rodando.
+#   python bench_reservation_latency.py [requests] [concurrency]
+
+TARGETS = {
+    "flask": "http://localhost:5000/api/reserve/new",
+    "async": "http://localhost:5004/api/reserve/new",
+}
+PAYLOAD = {"itinerary_id": 1, "passengers": 1, "client_id": 1}
+
+async def _run(url, total, concurrency):
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, json=PAYLOAD)
+                    if response.status_code != 201:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, total / elapsed
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+if __name__ == '__main__':
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"{total} reservas, concorrência {concurrency}")
+    print(f"{'variante':<8}{'p50 ms':>10}{'p95 ms':>10}{'média ms':>10}{'req/s':>10}{'erros':>8}")
+    for name, url in TARGETS.items():
+        latencies, errors, rate = asyncio.run(_run(url, total, concurrency))
+        print(f"{name:<8}{_percentile(latencies, 0.5) * 1000:>10.1f}{_percentile(latencies, 0.95) * 1000:>10.1f}"
+              f"{statistics.mean(latencies) * 1000:>10.1f}{rate:>10.1f}{errors:>8}")
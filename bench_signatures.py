@@ -0,0 +1,29 @@
+import time
+from config import RSA_SIGNATURE_ALGORITHM, ED25519_SIGNATURE_ALGORITHM
+from keys import generate_private_key
+from utils import sign_bytes, verify_bytes
+
+MESSAGE = b"Payment approved for Bahamas on ship OceanX."
+ITERATIONS = 2000
+
+def _rate(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    return iterations / elapsed
+
+def benchmark(algorithm, iterations=ITERATIONS):
+    private_key = generate_private_key(algorithm)
+    public_key = private_key.public_key()
+    signature = sign_bytes(MESSAGE, private_key)
+
+    sign_rate = _rate(lambda: sign_bytes(MESSAGE, private_key), iterations)
+    verify_rate = _rate(lambda: verify_bytes(MESSAGE, signature, public_key), iterations)
+    return sign_rate, verify_rate, len(signature)
+
+if __name__ == '__main__':
+    print(f"{'algorithm':<22}{'sign/s':>12}{'verify/s':>12}{'sig bytes':>11}")
+    for algorithm in (RSA_SIGNATURE_ALGORITHM, ED25519_SIGNATURE_ALGORITHM):
+        sign_rate, verify_rate, size = benchmark(algorithm)
+        print(f"{algorithm:<22}{sign_rate:>12.0f}{verify_rate:>12.0f}{size:>11}")
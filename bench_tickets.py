@@ -0,0 +1,45 @@
+import sys
+import time
+import pika
+from config import RABBITMQ_HOST, PAYMENT_EXCHANGE, PAYMENT_APPROVED_QUEUE, TICKET_EXCHANGE, TICKET_ISSUED_QUEUE, PAYMENT_PRIVATE_KEY_FILE
+from codec import encode
+from messages import Envelope, PAYMENT_APPROVED
+from utils import create_signed_message
+
+# Measures Ticket MS throughput end to end: publishes N signed payment
+# approvals and waits for N ticket events. Start ticket.py first.
+#   python bench_tickets.py [messages]
+
+def main(messages=10000):
+    connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+    channel = connection.channel()
+    channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
+    channel.exchange_declare(exchange=TICKET_EXCHANGE, exchange_type='direct')
+    tickets_queue = channel.queue_declare(queue='', exclusive=True).method.queue
+    channel.queue_bind(exchange=TICKET_EXCHANGE, queue=tickets_queue, routing_key=TICKET_ISSUED_QUEUE)
+
+    # One signature reused for every message: only the ticket path is measured
+    signed = create_signed_message("Payment approved for Bahamas on ship OceanX.", PAYMENT_PRIVATE_KEY_FILE)
+    received = 0
+    start = time.perf_counter()
+    for i in range(messages):
+        body, content_type = encode({**signed, "reservation_id": i})
+        channel.basic_publish(PAYMENT_EXCHANGE, PAYMENT_APPROVED_QUEUE, body, Envelope(PAYMENT_APPROVED, i).properties(content_type))
+    published = time.perf_counter()
+
+    for method, properties, body in channel.consume(tickets_queue, auto_ack=True, inactivity_timeout=10):
+        if method is None:
+            print(f"Timed out waiting for tickets ({received}/{messages} received).")
+            break
+        received += 1
+        if received == messages:
+            break
+    elapsed = time.perf_counter() - start
+    channel.cancel()
+    connection.close()
+
+    print(f"published {messages} approvals in {published - start:.2f}s")
+    print(f"{received} tickets in {elapsed:.2f}s: {received / elapsed:,.0f} tickets/s")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,171 @@
+import json
+import random
+import time
+from datetime import datetime
+from config import CAMPAIGN_TICK, CAMPAIGN_BATCH_SIZE, CAMPAIGN_REPORT_INTERVAL
+
+DEFAULT_MESSAGE = "{destination} - {promotion} - {time}"
+
+class TokenBucket:
+    """Allows ``rate`` events per second on average and bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        # Default: ten ticks' worth, so a late tick does not lose tokens
+        self.burst = burst if burst is not None else max(rate * CAMPAIGN_TICK * 10, 1)
+        self.clock = clock
+        self.tokens = 0.0
+        self.updated = clock()
+
+    def take(self, limit=None):
+        """Take every whole token available (at most ``limit``); returns how many."""
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        taken = int(self.tokens)
+        if limit is not None:
+            taken = min(taken, limit)
+        self.tokens -= taken
+        return taken
+
+    def reset(self):
+        self.tokens = 0.0
+        self.updated = self.clock()
+
+class Campaign:
+    def __init__(self, name, buckets, message=DEFAULT_MESSAGE, start=None, end=None):
+        self.name = name
+        self.buckets = buckets
+        self.message = message
+        self.start = start
+        self.end = end
+        self.sent = 0
+        self.active = False
+
+    @property
+    def target_rate(self):
+        return sum(bucket.rate for bucket in self.buckets.values())
+
+    def in_window(self, now):
+        return (self.start is None or now >= self.start) and (self.end is None or now < self.end)
+
+    def finished(self, now):
+        return self.end is not None and now >= self.end
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+def load_campaigns(file_name, destinations):
+    """Campaigns from a JSON file; ``destinations`` is the itinerary catalog's list.
+
+    Each campaign has a ``name``, ``destinations`` (list or ``"*"``), a
+    per-destination ``rate`` (promotions/s) with optional ``rates``
+    overrides and ``burst``, an optional ``start``/``end`` window (ISO
+    datetimes) and a ``message`` template.
+    """
+    with open(file_name, "r") as f:
+        spec = json.load(f)
+
+    campaigns = []
+    for entry in spec["campaigns"]:
+        selected = entry.get("destinations", "*")
+        if selected == "*":
+            selected = destinations
+        unknown = set(selected) - set(destinations)
+        if unknown:
+            raise ValueError(f"Campaign {entry['name']}: unknown destinations {sorted(unknown)}")
+        rates = entry.get("rates", {})
+        buckets = {
+            destination: TokenBucket(rates.get(destination, entry["rate"]), entry.get("burst"))
+            for destination in selected
+        }
+        campaigns.append(Campaign(
+            entry["name"], buckets, entry.get("message", DEFAULT_MESSAGE),
+            _parse_time(entry.get("start")), _parse_time(entry.get("end"))
+        ))
+    return campaigns
+
+class CampaignEngine:
+    """Runs campaigns on one publishing connection.
+
+    Every ``tick`` seconds each active campaign takes the tokens its buckets
+    earned and publishes that many promotions. ``flush`` is called after
+    every ``batch_size`` messages and at the end of each tick; marketing.py
+    waits there for the broker's confirms, so the achieved rates reported
+    every ``report_interval`` seconds (and at the end) are what the broker
+    accepted.
+    """
+
+    def __init__(self, campaigns, itineraries, publish, flush=lambda: None,
+                 tick=CAMPAIGN_TICK, batch_size=CAMPAIGN_BATCH_SIZE, report_interval=CAMPAIGN_REPORT_INTERVAL):
+        self.campaigns = campaigns
+        self.publish = publish
+        self.flush = flush
+        self.tick = tick
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self.promotions = {}
+        for itinerary in itineraries:
+            self.promotions.setdefault(itinerary["destination"], []).append(itinerary.get("promotion", "Special offer!"))
+
+    def run(self, duration=None):
+        started = last_report = time.monotonic()
+        reported = {campaign.name: 0 for campaign in self.campaigns}
+        pending = 0
+        try:
+            while duration is None or time.monotonic() - started < duration:
+                tick_started = time.monotonic()
+                now = datetime.now()
+                if all(campaign.finished(now) for campaign in self.campaigns):
+                    break
+                current_time = now.strftime("%d/%m/%Y %H:%M:%S")
+                for campaign in self.campaigns:
+                    pending = self._run_campaign(campaign, now, current_time, pending)
+                if pending:
+                    self.flush()
+                    pending = 0
+
+                if tick_started - last_report >= self.report_interval:
+                    self._report(reported, tick_started - last_report)
+                    last_report = tick_started
+                time.sleep(max(0.0, self.tick - (time.monotonic() - tick_started)))
+        except KeyboardInterrupt:
+            pass
+        self.flush()
+        self._summary(time.monotonic() - started)
+
+    def _run_campaign(self, campaign, now, current_time, pending):
+        if not campaign.in_window(now):
+            campaign.active = False
+            return pending
+        if not campaign.active:
+            # Nothing accumulates while the campaign is outside its window
+            for bucket in campaign.buckets.values():
+                bucket.reset()
+            campaign.active = True
+            print(f"[Marketing] Campaign '{campaign.name}' started.")
+
+        for destination, bucket in campaign.buckets.items():
+            promotions = self.promotions[destination]
+            for _ in range(bucket.take()):
+                message = campaign.message.format(destination=destination, promotion=random.choice(promotions), time=current_time, campaign=campaign.name)
+                self.publish(destination, message)
+                campaign.sent += 1
+                pending += 1
+                if pending >= self.batch_size:
+                    self.flush()
+                    pending = 0
+        return pending
+
+    def _report(self, reported, elapsed):
+        for campaign in self.campaigns:
+            rate = (campaign.sent - reported[campaign.name]) / elapsed
+            reported[campaign.name] = campaign.sent
+            target = campaign.target_rate if campaign.active else 0
+            print(f"[Marketing] {campaign.name}: {rate:,.0f} promotions/s (target {target:,.0f}), {campaign.sent:,} sent")
+
+    def _summary(self, elapsed):
+        total = sum(campaign.sent for campaign in self.campaigns)
+        print(f"[Marketing] {total:,} promotions in {elapsed:.1f}s: {total / elapsed if elapsed else 0:,.0f} promotions/s achieved")
+        for campaign in self.campaigns:
+            print(f"[Marketing]     {campaign.name}: {campaign.sent:,} sent")
@@ -0,0 +1,66 @@
+import json
+from config import MESSAGE_CONTENT_TYPE
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+
+# Hex-encoded in the JSON messages and in the dicts handlers work with
+BINARY_FIELDS = ("signature",)
+
+class JsonCodec:
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, data):
+        return json.dumps(data).encode()
+
+    def decode(self, body):
+        return json.loads(body)
+
+class MsgpackCodec:
+    """msgpack with binary fields (signatures) sent as raw bytes instead of hex."""
+
+    content_type = MSGPACK_CONTENT_TYPE
+
+    def encode(self, data):
+        if any(field in data for field in BINARY_FIELDS):
+            data = {key: bytes.fromhex(value) if key in BINARY_FIELDS and isinstance(value, str) else value for key, value in data.items()}
+        return msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, body):
+        data = msgpack.unpackb(body, raw=False)
+        if isinstance(data, dict):
+            for field in BINARY_FIELDS:
+                if isinstance(data.get(field), bytes):
+                    data[field] = data[field].hex()
+        return data
+
+CODECS = {JSON_CONTENT_TYPE: JsonCodec()}
+if msgpack is not None:
+    CODECS[MSGPACK_CONTENT_TYPE] = MsgpackCodec()
+
+def codec_for(content_type=None):
+    """Codec for a content type; messages without one are JSON."""
+    codec = CODECS.get(content_type or JSON_CONTENT_TYPE)
+    if codec is None:
+        raise ValueError(f"Unsupported message content type: {content_type}")
+    return codec
+
+def default_codec():
+    """Codec for outgoing messages: MESSAGE_CONTENT_TYPE, or JSON when msgpack is not installed."""
+    return CODECS.get(MESSAGE_CONTENT_TYPE, CODECS[JSON_CONTENT_TYPE])
+
+def encode(data, codec=None):
+    """Encode ``data`` for publishing; returns the body and its content type."""
+    codec = codec or default_codec()
+    return codec.encode(data), codec.content_type
+
+def decode(body, content_type=None):
+    return codec_for(content_type).decode(body)
+
+def decode_message(properties, body):
+    return decode(body, properties.content_type if properties is not None else None)
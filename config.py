@@ -1,7 +1,11 @@
+import os
+
 # Constants for queue names
 
 RESERVATION_CREATED_QUEUE = "reservation-created"
 RESERVATION_CANCELLED_QUEUE = "reservation-cancelled"
+# Itinerary MS -> Reservation MS: holds that expired or were never granted
+RESERVATION_EXPIRED_QUEUE = "reservation-expired"
 PAYMENT_APPROVED_TICKED_QUEUE = "payment-approved-ticket"
 PAYMENT_APPROVED_QUEUE = "payment-approved"
 PAYMENT_DECLINED_QUEUE = "payment-declined"
@@ -9,7 +13,11 @@ TICKET_ISSUED_QUEUE = "ticket-issued"
 PAYMENT_EXCHANGE = "payment-exchange"
 TICKET_EXCHANGE = "ticket-exchange"
 RESERVATION_CANCELLED_QUEUE = "reservation-cancelled"
-MARKETING_EXCHANGE = "marketing-exchange"
+# Topic exchange; promotions are routed by destination (see messages.promotion_routing_key)
+MARKETING_EXCHANGE = "marketing-topic-exchange"
+INVENTORY_EXCHANGE = "inventory-exchange"
+ITINERARY_PAYMENT_APPROVED_QUEUE = "itinerary-payment-approved"
+ITINERARY_PAYMENT_DECLINED_QUEUE = "itinerary-payment-declined"
 RESERVATION_QUEUES = [
     RESERVATION_CREATED_QUEUE,
     PAYMENT_APPROVED_QUEUE,
@@ -17,11 +25,114 @@ RESERVATION_QUEUES = [
     TICKET_ISSUED_QUEUE
 ]
 
+# Encoding of queue payloads (codec.py): "application/msgpack" (compact,
+# raw signature bytes; needs the msgpack package) or "application/json"
+# (readable, for debugging). Consumers decode by each message's content_type.
+MESSAGE_CONTENT_TYPE = "application/msgpack"
+
+# Publisher (publisher.py): connections owned by each process's publisher,
+# messages published per I/O loop turn, unconfirmed messages allowed per
+# connection and how long a caller waits for the broker to confirm
+PUBLISHER_CONNECTIONS = 2
+PUBLISHER_BATCH_SIZE = 100
+PUBLISHER_MAX_IN_FLIGHT = 1000
+PUBLISHER_CONFIRM_TIMEOUT = 5.0
+PUBLISHER_RECONNECT_DELAY = 1.0
+
+# Reservation MS consumers (consumer_pool.py): unacked messages the broker
+# may push per queue (prefetch) and handler threads per queue. Exclusive
+# queues are keyed by their logical name ("promotions", "inventory").
+# Payment events are dispatched to their threads by reservation id, so the
+# events of one reservation are still handled in delivery order.
+# Declined payments must prefetch at least VERIFY_BATCH_SIZE messages.
+CONSUMER_PREFETCH = {
+    PAYMENT_APPROVED_QUEUE: 50,
+    PAYMENT_DECLINED_QUEUE: 64,
+    TICKET_ISSUED_QUEUE: 50,
+    "promotions": 20,
+    "inventory": 100,
+}
+CONSUMER_CONCURRENCY = {
+    PAYMENT_APPROVED_QUEUE: 8,
+    PAYMENT_DECLINED_QUEUE: 8,
+    TICKET_ISSUED_QUEUE: 8,
+    "promotions": 4,
+    # Availability events must be applied in order
+    "inventory": 1,
+}
+CONSUMER_DEFAULT_PREFETCH = 20
+CONSUMER_DEFAULT_CONCURRENCY = 4
+CONSUMER_METRICS_INTERVAL = 5.0
+CONSUMER_LATENCY_SAMPLES = 1000
+
+# Ticket MS (ticket.py): unacked payment approvals in flight, threads
+# building ticket events and seconds between throughput reports
+TICKET_PREFETCH = 256
+TICKET_WORKERS = 8
+TICKET_REPORT_INTERVAL = 5.0
+# Ticket documents are rendered on TICKET_RENDER_WORKERS processes and
+# stored by content hash; the Reservation MS serves them from the same directory
+TICKET_RENDER_WORKERS = os.cpu_count() or 1
+TICKET_DOCUMENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "tickets")
+
 # Constants for file paths
 ITINERARIES_FILE = "itineraries.json"
+MARKETING_CAMPAIGNS_FILE = "campaigns.json"
+
+# Marketing campaign engine (campaigns.py): scheduling tick, promotions
+# published before waiting for the broker's confirms and seconds between rate reports
+CAMPAIGN_TICK = 0.01
+CAMPAIGN_BATCH_SIZE = 500
+CAMPAIGN_REPORT_INTERVAL = 5.0
+
+# Pagination for /itineraries
+ITINERARY_PAGE_SIZE = 20
+ITINERARY_MAX_PAGE_SIZE = 100
+
+# Number of locks shared by itinerary cabin counters (lock striping)
+INVENTORY_LOCK_STRIPES = 64
+
+# Itinerary MS inventory write-ahead log and snapshots
+INVENTORY_DATA_DIR = "data"
+INVENTORY_SNAPSHOT_EVERY = 10000
+INVENTORY_WAL_FSYNC = False
+
+# Cabins of a new reservation are held until payment is approved, declined
+# or this many seconds pass; expiry is checked every CABIN_HOLD_TICK seconds
+CABIN_HOLD_TIMEOUT = 900
+CABIN_HOLD_TICK = 1.0
+# Expired holds remembered so a payment approved after its hold expired can take the cabins again
+EXPIRED_HOLDS_KEPT = 10000
+
+# Reservation ids: snowflake epoch (2025-01-01 UTC). Each Reservation MS
+# process needs a different node id (0-31): processes on one host claim a free
+# one with a lock file in RESERVATION_NODE_LOCK_DIR; across hosts set the
+# RESERVATION_NODE_ID environment variable on every process
+ID_EPOCH_MS = 1735689600000
+RESERVATION_NODE_LOCK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "node-ids")
+
+# Reservation MS store: "memory" or "sqlite"
+RESERVATION_STORE_BACKEND = "memory"
+RESERVATION_DB_FILE = "data/reservations.db"
+RESERVATION_ARCHIVE_SIZE = 10000
+# Reservations still pending/approved after this many seconds are archived too
+RESERVATION_ACTIVE_MAX_AGE = 4 * CABIN_HOLD_TIMEOUT
+RESERVATION_WRITE_BATCH_SIZE = 200
+RESERVATION_WRITE_INTERVAL = 0.5
+
+# Max serialized /itineraries responses kept in the Itinerary MS cache
+ITINERARY_CACHE_SIZE = 1024
 PAYMENT_PUBLIC_KEY_FILE = "payment_public.pem"
 PAYMENT_PRIVATE_KEY_FILE = "payment_private.pem"
 
+# Batched signature verification for payment-event consumers
+VERIFY_BATCH_SIZE = 32
+VERIFY_BATCH_MAX_WAIT = 0.05
+VERIFY_WORKERS = os.cpu_count() or 1
+
+# Seconds between checks for key files changed on disk (key rotation)
+KEY_RELOAD_CHECK_INTERVAL = 1.0
+
 # Constants for RabbitMQ connection parameters
 RABBITMQ_HOST = "localhost"
 RABBITMQ_PORT = 15672
@@ -29,6 +140,8 @@ RABBITMQ_PORT = 15672
 # Constants for cryptographic parameters
 HASH_ALGORITHM = "SHA256"
 SIGNATURE_PADDING = "PKCS1v15"
+RSA_SIGNATURE_ALGORITHM = "RSA-PKCS1v15-SHA256"
+ED25519_SIGNATURE_ALGORITHM = "Ed25519"
 
 # Constants for message formats
 RESERVATION_MESSAGE_FORMAT = {
@@ -74,5 +187,28 @@ ITINERARY_TEMPLATES = (
 SEARCH_SUCCESS_MESSAGE = "Search completed successfully."
 SEARCH_FAILURE_MESSAGE = "No itineraries found."
 
+# Reservation MS itinerary cache (kept fresh by inventory-exchange events;
+# the TTL only bounds staleness if an event is missed)
+RESERVATION_ITINERARY_CACHE_SIZE = 10000
+RESERVATION_ITINERARY_CACHE_TTL = 60.0
+RESERVATION_SEARCH_CACHE_SIZE = 1000
+
+# Shared HTTP client (http_client.py)
+HTTP_CONNECT_TIMEOUT = 1.0
+HTTP_READ_TIMEOUT = 5.0
+HTTP_POOL_SIZE = 20
+HTTP_MAX_RETRIES = 2
+HTTP_BACKOFF_BASE = 0.1
+HTTP_BACKOFF_MAX = 1.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 10.0
+
+# Payment MS idempotency (idempotency.py): stored responses to payment link
+# requests and webhooks; set IDEMPOTENCY_DB_FILE (e.g. "data/idempotency.db")
+# to keep them in SQLite across restarts
+IDEMPOTENCY_CACHE_SIZE = 10000
+IDEMPOTENCY_TTL = 24 * 3600
+IDEMPOTENCY_DB_FILE = None
+
 EXTERNAL_PAYMENT_SYSTEM_URL = "http://localhost:5002/ext/process"
 PAYMENT_WEBHOOK_URL = "http://localhost:5001/payments/webhook"
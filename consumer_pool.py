@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    CONSUMER_PREFETCH, CONSUMER_CONCURRENCY, CONSUMER_DEFAULT_PREFETCH, CONSUMER_DEFAULT_CONCURRENCY,
+    CONSUMER_METRICS_INTERVAL, CONSUMER_LATENCY_SAMPLES
+)
+
+class QueueStats:
+    """Counters and recent timings for one consumed queue."""
+
+    def __init__(self, name, samples=CONSUMER_LATENCY_SAMPLES):
+        self.name = name
+        self.received = 0
+        self.completed = 0
+        self.failed = 0
+        self.backlog = None
+        self._waits = deque(maxlen=samples)
+        self._latencies = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def record_received(self):
+        with self._lock:
+            self.received += 1
+
+    def record_done(self, wait, latency, ok):
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._waits.append(wait)
+            self._latencies.append(latency)
+
+    def to_dict(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            latencies = sorted(self._latencies)
+            return {
+                "received": self.received,
+                "completed": self.completed,
+                "failed": self.failed,
+                # Delivered to this process but not yet acked
+                "in_flight": self.received - self.completed - self.failed,
+                # Ready in the broker, refreshed every CONSUMER_METRICS_INTERVAL seconds
+                "backlog": self.backlog,
+                "wait_ms": _summary(waits),
+                "handler_ms": _summary(latencies),
+            }
+
+def _summary(samples):
+    if not samples:
+        return None
+    return {
+        "avg": round(sum(samples) / len(samples) * 1000, 3),
+        "p95": round(samples[max(0, -(-len(samples) * 95 // 100) - 1)] * 1000, 3),
+        "max": round(samples[-1] * 1000, 3),
+    }
+
+class ConsumerPool:
+    """Runs pika message handlers on per-queue thread pools.
+
+    ``consume`` sets the queue's prefetch (``basic_qos`` before
+    ``basic_consume`` makes it per consumer), so the broker never pushes more
+    than ``prefetch`` unacked messages for that queue. Handlers wrapped with
+    ``wrap`` run on a pool of at most ``concurrency`` threads for that queue,
+    so one slow queue cannot stall the others. With ``key(properties)``,
+    each message goes to the thread picked by its key, so messages with the
+    same key are handled one at a time in delivery order. When a handler
+    returns the message is acked, when it raises it is rejected; both are
+    sent from the connection thread through ``add_callback_threadsafe``.
+    Backlog polling uses its own channel: a failed passive declare closes
+    only that channel, not the consumers'.
+    """
+
+    def __init__(self, channel, metrics_interval=CONSUMER_METRICS_INTERVAL):
+        self.channel = channel
+        self.connection = channel.connection
+        self.metrics_interval = metrics_interval
+        self._stats = {}
+        self._queues = {}
+        self._metrics_channel = None
+
+    def consume(self, queue, on_message, name=None):
+        name = name or queue
+        self._queues[name] = queue
+        self.channel.basic_qos(prefetch_count=CONSUMER_PREFETCH.get(name, CONSUMER_DEFAULT_PREFETCH))
+        self.channel.basic_consume(queue=queue, on_message_callback=on_message, auto_ack=False)
+
+    def wrap(self, name, handler, key=None):
+        concurrency = CONSUMER_CONCURRENCY.get(name, CONSUMER_DEFAULT_CONCURRENCY)
+        stats = self._stats.setdefault(name, QueueStats(name))
+        if key is None:
+            executors = [ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"consumer-{name}")]
+        else:
+            executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"consumer-{name}-{i}") for i in range(concurrency)]
+
+        def on_message(ch, method, properties, body):
+            stats.record_received()
+            executor = executors[hash(key(properties)) % len(executors)] if key is not None else executors[0]
+            executor.submit(self._run, stats, handler, ch, method, properties, body, time.monotonic())
+        return on_message
+
+    def start_metrics(self):
+        self.connection.call_later(self.metrics_interval, self._refresh_backlog)
+
+    def stats(self):
+        return {name: stats.to_dict() for name, stats in list(self._stats.items())}
+
+    def _run(self, stats, handler, ch, method, properties, body, received_at):
+        started = time.monotonic()
+        try:
+            handler(ch, method, properties, body)
+            ok = True
+        except Exception as e:
+            print(f"[Consumer Pool ERROR] Handler for '{stats.name}' failed on message {method.delivery_tag}: {e}")
+            ok = False
+        stats.record_done(started - received_at, time.monotonic() - started, ok)
+        tag = method.delivery_tag
+        if ok:
+            self.connection.add_callback_threadsafe(lambda: ch.basic_ack(tag))
+        else:
+            self.connection.add_callback_threadsafe(lambda: ch.basic_reject(tag, requeue=False))
+
+    def _refresh_backlog(self):
+        for name, queue in self._queues.items():
+            stats = self._stats.get(name)
+            if stats is None:
+                continue
+            try:
+                if self._metrics_channel is None or not self._metrics_channel.is_open:
+                    self._metrics_channel = self.connection.channel()
+                stats.backlog = self._metrics_channel.queue_declare(queue=queue, passive=True).method.message_count
+            except Exception as e:
+                print(f"[Consumer Pool ERROR] Failed to read backlog of '{name}': {e}")
+        self.connection.call_later(self.metrics_interval, self._refresh_backlog)
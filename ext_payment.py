@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 import random
 import requests
+from http_client import http
 import threading
 from config import PAYMENT_WEBHOOK_URL
 from request_dto import PaymentPayload, PaymentResponse
@@ -39,7 +40,7 @@ class ExternalPaymentSystem:
     def send_webhook_notification(self, payload):
         try:
             print(f"[External Payment System] Sending webhook to {PAYMENT_WEBHOOK_URL} with status: {payload['status']} for transaction {payload['transaction_id']}")
-            response = requests.post(PAYMENT_WEBHOOK_URL, json=payload)
+            response = http.post(PAYMENT_WEBHOOK_URL, json=payload)
             response.raise_for_status()
             print(f"[External Payment System] Webhook sent successfully for transaction {payload['transaction_id']}. Response: {response.status_code}")
         except requests.exceptions.RequestException as e:
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from config import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE, HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a downstream's circuit is open."""
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures, then lets one
+    trial request through every ``reset_timeout`` seconds until one succeeds."""
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError(f"Circuit open for {self.name}")
+            # Half-open: this request is the trial, keep others out meanwhile
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    print(f"[HTTP Client] Circuit opened for {self.name} after {self.failures} failures.")
+                self.opened_at = time.monotonic()
+
+class HttpClient:
+    """Shared HTTP client: one keep-alive connection pool per host, connect and
+    read timeouts on every call, bounded retries with jittered exponential
+    backoff and a circuit breaker per downstream (scheme://host:port).
+
+    Non-idempotent requests (POST, PATCH) are only retried when the
+    connection could not be established, i.e. nothing was sent.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), max_retries=HTTP_MAX_RETRIES):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def breaker_for(self, url):
+        parts = urlsplit(url)
+        name = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name)
+            return self._breakers[name]
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        breaker = self.breaker_for(url)
+        attempt = 0
+        while True:
+            breaker.before_request()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                breaker.record_failure()
+                if not self._should_retry(method, e, attempt):
+                    raise
+            else:
+                if response.status_code < 500:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if not self._should_retry(method, None, attempt):
+                    return response
+            attempt += 1
+            time.sleep(random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * 2 ** attempt)))
+
+    def _should_retry(self, method, error, attempt):
+        if attempt >= self.max_retries:
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return error is None or isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        return isinstance(error, requests.exceptions.ConnectTimeout)
+
+http = HttpClient()
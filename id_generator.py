@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from config import ID_EPOCH_MS, RESERVATION_NODE_LOCK_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+TIMESTAMP_BITS = 41
+NODE_BITS = 5
+SEQUENCE_BITS = 7
+
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+NODE_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = NODE_BITS + SEQUENCE_BITS
+
+class SnowflakeGenerator:
+    """Unique, time-ordered 53-bit ids: milliseconds since ``ID_EPOCH_MS``,
+    node id and a per-millisecond sequence number.
+
+    53 bits keep the ids exact in JavaScript clients. Ids are unique only if
+    every running generator has its own ``node_id`` (0-31), see
+    ``node_id_from_env``. If the sequence runs out or the clock goes back,
+    the generator borrows the next millisecond instead of sleeping, so ids
+    never repeat and never decrease.
+    """
+
+    def __init__(self, node_id, epoch_ms=ID_EPOCH_MS, clock=time.time):
+        if not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f"node_id must be between 0 and {MAX_NODE_ID}.")
+        self.node_id = node_id
+        self.epoch_ms = epoch_ms
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        now = int(self.clock() * 1000) - self.epoch_ms
+        with self._lock:
+            if now > self._last_ms:
+                self._last_ms, self._sequence = now, 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms, self._sequence = self._last_ms + 1, 0
+            return (self._last_ms << TIMESTAMP_SHIFT) | (self.node_id << NODE_SHIFT) | self._sequence
+
+def id_timestamp(id, epoch_ms=ID_EPOCH_MS):
+    """Creation time (seconds since the Unix epoch) encoded in an id."""
+    return ((id >> TIMESTAMP_SHIFT) + epoch_ms) / 1000
+
+def id_range(start, end, epoch_ms=ID_EPOCH_MS):
+    """Smallest and largest id that can be generated between two Unix timestamps."""
+    low = max(int(start * 1000) - epoch_ms, 0) << TIMESTAMP_SHIFT
+    high = ((int(end * 1000) - epoch_ms + 1) << TIMESTAMP_SHIFT) - 1
+    return low, high
+
+# Claimed lock files stay open (and locked) for the life of the process
+_claimed_node_locks = []
+
+def claim_node_id(lock_dir=RESERVATION_NODE_LOCK_DIR):
+    """Claim the lowest node id no other process on this host holds.
+
+    Each id is an exclusive ``flock`` on ``<lock_dir>/<id>.lock``; the OS
+    releases it when the process exits, even on a crash. Raises RuntimeError
+    when every id is taken or file locks are not available.
+    """
+    if fcntl is None:
+        raise RuntimeError("Node ids can't be claimed on this platform: set RESERVATION_NODE_ID.")
+    os.makedirs(lock_dir, exist_ok=True)
+    for node_id in range(MAX_NODE_ID + 1):
+        lock_file = open(os.path.join(lock_dir, f"{node_id}.lock"), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        _claimed_node_locks.append(lock_file)
+        return node_id
+    raise RuntimeError(f"All {MAX_NODE_ID + 1} node ids are claimed in {lock_dir}: set RESERVATION_NODE_ID.")
+
+def node_id_from_env():
+    """The RESERVATION_NODE_ID environment variable if set (required when
+    Reservation MS processes run on several hosts), else an id claimed with
+    ``claim_node_id``.
+    """
+    value = os.environ.get("RESERVATION_NODE_ID")
+    if not value:
+        return claim_node_id()
+    node_id = int(value)
+    if not 0 <= node_id <= MAX_NODE_ID:
+        raise ValueError(f"RESERVATION_NODE_ID must be between 0 and {MAX_NODE_ID}.")
+    return node_id
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL, IDEMPOTENCY_DB_FILE
+from query_cache import QueryCache
+
+PURGE_EVERY = 1000
+MISMATCH_STATUS = 422
+
+def request_fingerprint(data):
+    """SHA-256 of a JSON request body, independent of key order."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+
+class IdempotencyStore:
+    """Stored ``(status, body)`` responses by idempotency key.
+
+    ``run(key, fn, fingerprint)`` calls ``fn`` only the first time a key is
+    seen (within ``ttl`` seconds) and returns the stored response afterwards;
+    concurrent calls with the same key wait for the first one instead of
+    repeating it. A key reused with a different request ``fingerprint``
+    gets a 422 instead of the other request's response. Only non-5xx
+    responses are stored, so failures can be retried. Entries live in a
+    bounded LRU in memory and, with ``db_file``, in SQLite too.
+    """
+
+    def __init__(self, max_size=IDEMPOTENCY_CACHE_SIZE, ttl=IDEMPOTENCY_TTL, db_file=IDEMPOTENCY_DB_FILE):
+        self.ttl = ttl
+        self.db_file = db_file
+        self.cache = QueryCache(max_size, ttl)
+        self.hits = 0
+        self.misses = 0
+        self.mismatches = 0
+        self._lock = threading.Lock()
+        self._in_progress = {}
+        self._local = threading.local()
+        self._writes = 0
+        if db_file:
+            if os.path.dirname(db_file):
+                os.makedirs(os.path.dirname(db_file), exist_ok=True)
+            conn = self._connection()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS idempotency (key TEXT PRIMARY KEY, status INTEGER, body TEXT, expires REAL, fingerprint TEXT)")
+            if "fingerprint" not in {row[1] for row in conn.execute("PRAGMA table_info(idempotency)")}:
+                conn.execute("ALTER TABLE idempotency ADD COLUMN fingerprint TEXT")
+            conn.commit()
+
+    def run(self, key, fn, fingerprint=None):
+        while True:
+            entry = self._get(key)
+            if entry is not None:
+                return self._replay(entry, fingerprint)
+            with self._lock:
+                pending = self._in_progress.get(key)
+                if pending is None:
+                    self._in_progress[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Same key being processed by another request: wait for its result
+            pending.wait()
+
+        try:
+            status, body = fn()
+            if status < 500:
+                self.put(key, status, body, fingerprint)
+            return status, body
+        finally:
+            with self._lock:
+                self._in_progress.pop(key).set()
+
+    def put(self, key, status, body, fingerprint=None):
+        """Store a response directly, e.g. once an operation that timed out completes."""
+        self.cache.put(key, (status, body, fingerprint))
+        if not self.db_file:
+            return
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO idempotency (key, status, body, expires, fingerprint) VALUES (?, ?, ?, ?, ?)",
+            (key, status, json.dumps(body), now + self.ttl, fingerprint)
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        if purge:
+            conn.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+        conn.commit()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "mismatches": self.mismatches, "hit_rate": self.hits / total if total else 0.0}
+
+    def _replay(self, entry, fingerprint):
+        status, body, stored_fingerprint = entry
+        if fingerprint is not None and stored_fingerprint is not None and fingerprint != stored_fingerprint:
+            with self._lock:
+                self.mismatches += 1
+            return MISMATCH_STATUS, {"error": "Idempotency key was already used with a different request."}
+        with self._lock:
+            self.hits += 1
+        return status, body
+
+    def _get(self, key):
+        entry = self.cache.get(key)
+        if entry is not None or not self.db_file:
+            return entry
+        row = self._connection().execute(
+            "SELECT status, body, fingerprint FROM idempotency WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], json.loads(row[1]), row[2])
+        self.cache.put(key, entry)
+        return entry
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_file)
+        return conn
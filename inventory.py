@@ -0,0 +1,117 @@
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from config import INVENTORY_LOCK_STRIPES
+from inventory_journal import RESERVE, RELEASE, CONFIRM, HELD, CONFIRMED
+
+class CabinInventory:
+    """Atomic cabin reserve/release per itinerary.
+
+    Counters live in the shared itinerary dicts (``available_cabins``) so
+    readers keep seeing plain data. Writers take one of ``stripes`` locks
+    picked from the itinerary id: operations on the same sailing are
+    serialized, while unrelated sailings almost never share a lock.
+    Reservations that hold cabins are tracked in ``reservations`` under the
+    same locks, and every change is written to ``journal`` (if given) before
+    it is applied. Reserving is idempotent per reservation id, because
+    reservation-created is delivered at least once. ``on_change(itinerary_id)`` runs after every successful
+    change, outside the stripe lock.
+    """
+
+    def __init__(self, itineraries, stripes=INVENTORY_LOCK_STRIPES, on_change=None, reservations=None, journal=None):
+        self.itineraries = itineraries
+        self.on_change = on_change
+        self.reservations = reservations if reservations is not None else {}
+        self.journal = journal
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock_for(self, itinerary_id):
+        return self._locks[hash(itinerary_id) % len(self._locks)]
+
+    @contextmanager
+    def locked(self):
+        """Hold every stripe lock, e.g. to take a consistent snapshot."""
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
+            yield
+
+    def available(self, itinerary_id):
+        return self.itineraries[itinerary_id].get("available_cabins", 0)
+
+    def reserve(self, itinerary_id, cabins, reservation_id=None):
+        """Take ``cabins`` if that many are free. Returns the remaining count, or None if not enough.
+
+        A ``reservation_id`` that already holds (or has confirmed) cabins takes
+        nothing more: the current remaining count is returned.
+        """
+        itinerary = self.itineraries.get(itinerary_id)
+        if itinerary is None or cabins <= 0:
+            return None
+        with self._lock_for(itinerary_id):
+            if reservation_id is not None and reservation_id in self.reservations:
+                return itinerary.get("available_cabins", 0)
+            available = itinerary.get("available_cabins", 0)
+            if available < cabins:
+                return None
+            if self.journal:
+                self.journal.append(RESERVE, reservation_id, itinerary_id, cabins)
+            itinerary["available_cabins"] = remaining = available - cabins
+            if reservation_id is not None:
+                self.reservations[reservation_id] = {
+                    "itinerary_id": itinerary_id,
+                    "passengers": cabins,
+                    "timestamp": datetime.now().isoformat(),
+                    "status": HELD
+                }
+        self._changed(itinerary_id)
+        return remaining
+
+    def release(self, itinerary_id, cabins, reservation_id=None):
+        """Give back ``cabins``, capped at ``total_cabins``. Returns the new count, or None for unknown ids."""
+        itinerary = self.itineraries.get(itinerary_id)
+        if itinerary is None:
+            return None
+        with self._lock_for(itinerary_id):
+            if reservation_id is not None and self.reservations.pop(reservation_id, None) is None:
+                return None
+            if self.journal:
+                self.journal.append(RELEASE, reservation_id, itinerary_id, cabins)
+            itinerary["available_cabins"] = available = min(
+                itinerary.get("available_cabins", 0) + cabins,
+                itinerary["total_cabins"]
+            )
+        self._changed(itinerary_id)
+        return available
+
+    def confirm(self, reservation_id):
+        """Turn a held reservation into a confirmed one. Returns False if it holds no cabins."""
+        reservation = self.reservations.get(reservation_id)
+        if reservation is None:
+            return False
+        with self._lock_for(reservation["itinerary_id"]):
+            if self.reservations.get(reservation_id) is not reservation:
+                return False
+            if reservation["status"] != CONFIRMED:
+                if self.journal:
+                    self.journal.append(CONFIRM, reservation_id, reservation["itinerary_id"], reservation["passengers"])
+                reservation["status"] = CONFIRMED
+        return True
+
+    def cancel(self, reservation_id):
+        """Release the cabins held by a reservation. Returns ``(itinerary_id, available)`` or None if it holds none."""
+        reservation = self.reservations.get(reservation_id)
+        if reservation is None:
+            return None
+        available = self.release(reservation["itinerary_id"], reservation["passengers"], reservation_id)
+        if available is None:
+            return None
+        return reservation["itinerary_id"], available
+
+    def _changed(self, itinerary_id):
+        if self.on_change:
+            self.on_change(itinerary_id)
+        if self.journal and self.journal.snapshot_due():
+            with self.locked():
+                if self.journal.snapshot_due():
+                    self.journal.snapshot(self.itineraries, self.reservations)
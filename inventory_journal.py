@@ -0,0 +1,188 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from config import INVENTORY_DATA_DIR, INVENTORY_SNAPSHOT_EVERY, INVENTORY_WAL_FSYNC
+
+RESERVE = 1
+RELEASE = 2
+CONFIRM = 3
+
+HELD = "held"
+CONFIRMED = "confirmed"
+STATUS_CODES = {HELD: 0, CONFIRMED: 1}
+STATUSES = {code: status for status, code in STATUS_CODES.items()}
+
+NO_RESERVATION = -1
+
+# op, reservation_id, itinerary_id, cabins, timestamp + crc32 of those fields
+RECORD = struct.Struct("<BqIId")
+RECORD_CRC = struct.Struct("<I")
+RECORD_SIZE = RECORD.size + RECORD_CRC.size
+
+SNAPSHOT_MAGIC = b"INVS"
+SNAPSHOT_HEADER = struct.Struct("<4sIQII")
+SNAPSHOT_ITINERARY = struct.Struct("<Ii")
+SNAPSHOT_VERSION = 2
+SNAPSHOT_RESERVATION = struct.Struct("<qIIdB")
+SNAPSHOT_RESERVATION_V1 = struct.Struct("<qIId")
+
+def apply_record(itineraries, reservations, op, reservation_id, itinerary_id, cabins, timestamp):
+    itinerary = itineraries.get(itinerary_id)
+    if itinerary is None:
+        return
+    if op == RESERVE:
+        itinerary["available_cabins"] = itinerary.get("available_cabins", 0) - cabins
+        if reservation_id != NO_RESERVATION:
+            reservations[reservation_id] = {
+                "itinerary_id": itinerary_id,
+                "passengers": cabins,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "status": HELD
+            }
+    elif op == CONFIRM:
+        if reservation_id in reservations:
+            reservations[reservation_id]["status"] = CONFIRMED
+    elif op == RELEASE:
+        itinerary["available_cabins"] = min(itinerary.get("available_cabins", 0) + cabins, itinerary["total_cabins"])
+        reservations.pop(reservation_id, None)
+
+class InventoryJournal:
+    """Write-ahead log of cabin changes plus periodic binary snapshots.
+
+    Every reserve/confirm/release is appended as a fixed-size, checksummed record to
+    ``inventory-<generation>.wal``. ``snapshot`` writes the full cabin counts
+    and open reservations to ``inventory.snapshot`` (atomically, via rename)
+    and starts the next log generation, so recovery reads one snapshot and
+    replays at most ``snapshot_every`` records regardless of history length.
+    """
+
+    def __init__(self, directory=INVENTORY_DATA_DIR, snapshot_every=INVENTORY_SNAPSHOT_EVERY, fsync=INVENTORY_WAL_FSYNC):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.generation = 0
+        self.records_since_snapshot = 0
+        self._lock = threading.Lock()
+        self._log = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def snapshot_path(self):
+        return os.path.join(self.directory, "inventory.snapshot")
+
+    def log_path(self, generation):
+        return os.path.join(self.directory, f"inventory-{generation}.wal")
+
+    def recover(self, itineraries):
+        """Apply the latest snapshot and the log tail to ``itineraries`` in place; return the open reservations."""
+        started = time.perf_counter()
+        reservations = {}
+        if os.path.exists(self.snapshot_path):
+            self.generation = self._load_snapshot(itineraries, reservations)
+
+        replayed = self._replay(itineraries, reservations)
+        self.records_since_snapshot = replayed
+        self._log = open(self.log_path(self.generation), "ab")
+        print(f"[Inventory Journal] Recovered generation {self.generation}: {len(reservations)} open reservations, {replayed} log records replayed in {time.perf_counter() - started:.3f}s.")
+        return reservations
+
+    def append(self, op, reservation_id, itinerary_id, cabins):
+        fields = RECORD.pack(op, NO_RESERVATION if reservation_id is None else reservation_id, itinerary_id, cabins, time.time())
+        with self._lock:
+            self._log.write(fields + RECORD_CRC.pack(zlib.crc32(fields)))
+            self._log.flush()
+            if self.fsync:
+                os.fsync(self._log.fileno())
+            self.records_since_snapshot += 1
+
+    def snapshot_due(self):
+        return self.records_since_snapshot >= self.snapshot_every
+
+    def snapshot(self, itineraries, reservations):
+        """Persist a snapshot and roll the log. Callers must block all writers while this runs."""
+        with self._lock:
+            generation = self.generation + 1
+            parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, generation, len(itineraries), len(reservations))]
+            parts.extend(SNAPSHOT_ITINERARY.pack(id, itinerary.get("available_cabins", 0)) for id, itinerary in itineraries.items())
+            parts.extend(
+                SNAPSHOT_RESERVATION.pack(id, r["itinerary_id"], r["passengers"], datetime.fromisoformat(r["timestamp"]).timestamp(), STATUS_CODES[r.get("status", HELD)])
+                for id, r in reservations.items()
+            )
+            data = b"".join(parts)
+
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data + RECORD_CRC.pack(zlib.crc32(data)))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            old_log, old_generation = self._log, self.generation
+            self._log = open(self.log_path(generation), "ab")
+            self.generation = generation
+            self.records_since_snapshot = 0
+            if old_log:
+                old_log.close()
+                os.remove(self.log_path(old_generation))
+        print(f"[Inventory Journal] Snapshot written for generation {generation} ({len(reservations)} open reservations).")
+
+    def close(self):
+        with self._lock:
+            if self._log:
+                self._log.close()
+                self._log = None
+
+    def _load_snapshot(self, itineraries, reservations):
+        with open(self.snapshot_path, "rb") as f:
+            data = f.read()
+        body, (crc,) = data[:-RECORD_CRC.size], RECORD_CRC.unpack(data[-RECORD_CRC.size:])
+        if zlib.crc32(body) != crc:
+            raise ValueError(f"Corrupted inventory snapshot: {self.snapshot_path}")
+
+        magic, version, generation, itinerary_count, reservation_count = SNAPSHOT_HEADER.unpack_from(body)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"Not an inventory snapshot: {self.snapshot_path}")
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(itinerary_count):
+            id, available = SNAPSHOT_ITINERARY.unpack_from(body, offset)
+            offset += SNAPSHOT_ITINERARY.size
+            if id in itineraries:
+                itineraries[id]["available_cabins"] = available
+        layout = SNAPSHOT_RESERVATION if version >= 2 else SNAPSHOT_RESERVATION_V1
+        for _ in range(reservation_count):
+            id, itinerary_id, passengers, timestamp, *status = layout.unpack_from(body, offset)
+            offset += layout.size
+            reservations[id] = {
+                "itinerary_id": itinerary_id,
+                "passengers": passengers,
+                "timestamp": datetime.fromtimestamp(timestamp).isoformat(),
+                "status": STATUSES[status[0]] if status else HELD
+            }
+        return generation
+
+    def _replay(self, itineraries, reservations):
+        path = self.log_path(self.generation)
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            data = f.read()
+
+        count, offset = 0, 0
+        while offset + RECORD_SIZE <= len(data):
+            fields = data[offset:offset + RECORD.size]
+            (crc,) = RECORD_CRC.unpack_from(data, offset + RECORD.size)
+            if zlib.crc32(fields) != crc:
+                break
+            apply_record(itineraries, reservations, *RECORD.unpack(fields))
+            offset += RECORD_SIZE
+            count += 1
+
+        if offset != len(data):
+            # Torn or corrupted tail from a crash mid-write: drop it
+            print(f"[Inventory Journal] Truncating {len(data) - offset} bytes of incomplete log at {path}.")
+            with open(path, "r+b") as f:
+                f.truncate(offset)
+        return count
@@ -1,35 +1,89 @@
-import json
 import threading
+from collections import OrderedDict
+from flask import Flask, request, jsonify, Response
 from datetime import datetime
-from flask import Flask, request, jsonify
 from config import (
     ITINERARIES_FILE,
     RESERVATION_CREATED_QUEUE,
-    RESERVATION_CANCELLED_QUEUE
+    RESERVATION_CANCELLED_QUEUE,
+    RESERVATION_EXPIRED_QUEUE,
+    PAYMENT_EXCHANGE,
+    INVENTORY_EXCHANGE,
+    PAYMENT_APPROVED_QUEUE,
+    PAYMENT_DECLINED_QUEUE,
+    ITINERARY_PAYMENT_APPROVED_QUEUE,
+    ITINERARY_PAYMENT_DECLINED_QUEUE,
+    CABIN_HOLD_TIMEOUT,
+    CABIN_HOLD_TICK,
+    EXPIRED_HOLDS_KEPT
 )
 from utils import load_itineraries, create_channel
+from messages import Envelope, INVENTORY_CHANGED, RESERVATION_EXPIRED, RESERVATION_REJECTED
+from codec import encode, decode_message
 from request_dto import Itinerary
+from itinerary_index import ItineraryIndex, IndexUpdater
+from query_cache import QueryCache
+from inventory import CabinInventory
+from inventory_journal import InventoryJournal, HELD
+from timing_wheel import TimingWheel
+from verification import BatchVerifier, verify_payment_message
 
 class ItineraryService:
     def __init__(self):
         self.app = Flask(__name__)
         self._register_routes()
         self. all_itineraries = load_itineraries(ITINERARIES_FILE)
+        self.journal = InventoryJournal()
+        self.reservations = self.journal.recover(self.all_itineraries)
+        self.index = ItineraryIndex(self.all_itineraries)
+        self.cache = QueryCache()
+        self.inventory_version = 0
+        self._version_lock = threading.Lock()
+        # Index updates and events run on the updater thread, not under reserve()
+        self.index_updater = IndexUpdater(self.index, on_applied=self._inventory_changed)
+        self.inventory = CabinInventory(self.all_itineraries, on_change=self._cabins_changed, reservations=self.reservations, journal=self.journal)
+        # Only touched from the consumer thread
+        self.holds = TimingWheel(tick=CABIN_HOLD_TICK)
+        # reservation id -> (itinerary_id, passengers) of recently expired holds
+        self.expired_holds = OrderedDict()
+        self._consumer_channel = None
         consumer_thread = threading.Thread(target=self._start_rabbitmq_consumers, daemon=True)
         consumer_thread.start()
-        self.reservations = {}
 
     def _register_routes(self):
         self.app.add_url_rule('/itineraries', view_func=self.get_itineraries, methods=['GET'])
+        self.app.add_url_rule('/itineraries/cache-stats', view_func=self.get_cache_stats, methods=['GET'])
 
     def get_itineraries(self):
-        itinerary_request = Itinerary.from_dict(request.args)
-        if itinerary_request.id: return self._get_itinerary_id_from_request(itinerary_request.id)
-        filtered_itineraries = []
+        try:
+            itinerary_request = Itinerary.from_dict(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        for id, itinerary_details in self.all_itineraries.items():
-            if self._filter_itineraries(itinerary_request, itinerary_details):
-                filtered_itineraries.append(itinerary_details)
+        # Read the version before computing: a result racing with an inventory
+        # change is stored under the old version and never served afterwards.
+        version = self.inventory_version
+        key = itinerary_request.cache_key()
+        cached = self.cache.get(key, version)
+        if cached is None:
+            response, status = self._query_itineraries(itinerary_request)
+            cached = (response.get_data(), status)
+            if status in (200, 404):
+                self.cache.put(key, cached, version=version)
+        return Response(cached[0], status=cached[1], mimetype="application/json")
+
+    def get_cache_stats(self):
+        return jsonify({**self.cache.stats(), "inventory_version": self.inventory_version}), 200
+
+    def _query_itineraries(self, itinerary_request):
+        try:
+            if itinerary_request.id: return self._get_itinerary_id_from_request(itinerary_request.id)
+            filtered_itineraries, next_cursor = self.index.query(itinerary_request)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if itinerary_request.is_paginated():
+            return jsonify({"items": filtered_itineraries, "next_cursor": next_cursor}), 200
 
         if not filtered_itineraries:
             return jsonify({"message": "No itineraries found matching criteria or no availability."}), 404
@@ -40,58 +94,159 @@ class ItineraryService:
         ch = create_channel()
         ch.queue_declare(queue=RESERVATION_CREATED_QUEUE)
         ch.queue_declare(queue=RESERVATION_CANCELLED_QUEUE)
+        ch.queue_declare(queue=RESERVATION_EXPIRED_QUEUE)
+        ch.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
+        ch.exchange_declare(exchange=INVENTORY_EXCHANGE, exchange_type='fanout')
+        ch.queue_declare(queue=ITINERARY_PAYMENT_APPROVED_QUEUE)
+        ch.queue_declare(queue=ITINERARY_PAYMENT_DECLINED_QUEUE)
+        ch.queue_bind(exchange=PAYMENT_EXCHANGE, queue=ITINERARY_PAYMENT_APPROVED_QUEUE, routing_key=PAYMENT_APPROVED_QUEUE)
+        ch.queue_bind(exchange=PAYMENT_EXCHANGE, queue=ITINERARY_PAYMENT_DECLINED_QUEUE, routing_key=PAYMENT_DECLINED_QUEUE)
         ch.basic_consume(queue=RESERVATION_CREATED_QUEUE, on_message_callback=self._consume_reservation_created, auto_ack=False)
         ch.basic_consume(queue=RESERVATION_CANCELLED_QUEUE, on_message_callback=self._consume_reservation_cancelled_or_declined, auto_ack=False)
+        # Payment events confirm or free cabins: only act on ones signed by the Payment MS
+        verifier = BatchVerifier(ch.connection)
+        ch.basic_consume(
+            queue=ITINERARY_PAYMENT_APPROVED_QUEUE,
+            on_message_callback=verifier.wrap(ITINERARY_PAYMENT_APPROVED_QUEUE, verify_payment_message, self._consume_payment_approved, ack=False),
+            auto_ack=False
+        )
+        ch.basic_consume(
+            queue=ITINERARY_PAYMENT_DECLINED_QUEUE,
+            on_message_callback=verifier.wrap(ITINERARY_PAYMENT_DECLINED_QUEUE, verify_payment_message, self._consume_reservation_cancelled_or_declined, ack=False),
+            auto_ack=False
+        )
+
+        self._consumer_channel = ch
+        self._restore_holds()
+        self._schedule_hold_expiry(ch.connection)
         ch.start_consuming()  
 
+    def _restore_holds(self):
+        now = datetime.now()
+        for id, reservation in list(self.reservations.items()):
+            if reservation.get("status") == HELD:
+                age = (now - datetime.fromisoformat(reservation["timestamp"])).total_seconds()
+                self.holds.schedule(id, max(CABIN_HOLD_TIMEOUT - age, 0))
+
+    def _schedule_hold_expiry(self, connection):
+        def tick():
+            for id in self.holds.advance():
+                reservation = self.reservations.get(id)
+                released = self.inventory.cancel(id)
+                if released is not None:
+                    self._remember_expired(id, reservation)
+                    print(f"[Itinerary MS] Hold for reservation {id} expired: {released[1]} cabins available on itinerary {released[0]}.")
+                    self._publish_reservation_ended(Envelope(RESERVATION_EXPIRED, id), released[0], "Cabin hold expired before payment.")
+            connection.call_later(CABIN_HOLD_TICK, tick)
+        connection.call_later(CABIN_HOLD_TICK, tick)
+
     def _consume_reservation_created(self, ch, method, properties, body):
-        data = json.loads(body)
+        data = decode_message(properties, body)
         itinerary_id = int(data.get("itinerary_id"))
         passengers = int(data.get("passengers", 1))
         id = int(data.get("id"))
-        self.reservations[id] = {
-            "itinerary_id": itinerary_id,
-            "passengers": passengers,
-            "timestamp": datetime.now().isoformat()
-        }
 
-        if self.all_itineraries[itinerary_id].get("available_cabins", 0) >= passengers:
-            self.all_itineraries[itinerary_id]["available_cabins"] -= passengers
-            print(f"[Itinerary MS] Reservation created: {passengers} cabins booked for itinerary {itinerary_id}. Remaining: {self.all_itineraries[itinerary_id]['available_cabins']}.")
+        # reservation-created is published at least once: a redelivery must not re-arm the hold
+        if id in self.reservations:
+            print(f"[Itinerary MS] Reservation {id} already holds cabins, ignoring duplicate.")
+            ch.basic_ack(method.delivery_tag)
+            return
+
+        remaining = self.inventory.reserve(itinerary_id, passengers, id)
+        if remaining is not None:
+            self.holds.schedule(id, CABIN_HOLD_TIMEOUT)
+            print(f"[Itinerary MS] Reservation created: {passengers} cabins held for itinerary {itinerary_id}. Remaining: {remaining}.")
+        else:
+            print(f"[Itinerary MS] Not enough cabins on itinerary {itinerary_id} for reservation {id}.")
+            self._publish_reservation_ended(Envelope(RESERVATION_REJECTED, id, data.get("client_id")), itinerary_id, "Not enough cabins available.")
+
+        ch.basic_ack(method.delivery_tag)
 
+    def _consume_payment_approved(self, ch, method, properties, body):
+        data = decode_message(properties, body)
+        if data.get("reservation_id") is not None:
+            id = int(data["reservation_id"])
+            self.holds.cancel(id)
+            if self.inventory.confirm(id):
+                print(f"[Itinerary MS] Payment approved: cabins confirmed for reservation {id}.")
+            else:
+                self._late_payment_approved(id, data.get("client_id"))
         ch.basic_ack(method.delivery_tag)
 
+    def _late_payment_approved(self, id, client_id):
+        # Paid after the hold ended: take the cabins again if they are still free,
+        # otherwise tell the Reservation MS the paid booking has no cabins
+        expired = self.expired_holds.pop(id, None)
+        if expired is not None:
+            itinerary_id, passengers = expired
+            if self.inventory.reserve(itinerary_id, passengers, id) is not None and self.inventory.confirm(id):
+                print(f"[Itinerary MS] Payment approved after hold expired: cabins held again and confirmed for reservation {id}.")
+                return
+            message = "Payment approved after the cabin hold expired and the cabins were taken; refund required."
+        else:
+            itinerary_id = None
+            message = "Payment approved for a reservation that holds no cabins; refund required."
+        print(f"[Itinerary MS] {message} Reservation {id}.")
+        self._publish_reservation_ended(Envelope(RESERVATION_REJECTED, id, client_id), itinerary_id, message)
+
+    def _remember_expired(self, id, reservation):
+        if reservation is None:
+            return
+        self.expired_holds[id] = (reservation["itinerary_id"], reservation["passengers"])
+        while len(self.expired_holds) > EXPIRED_HOLDS_KEPT:
+            self.expired_holds.popitem(last=False)
+
     def _consume_reservation_cancelled_or_declined(self, ch, method, properties, body):
-        data = json.loads(body)
-        print(self.reservations)
+        data = decode_message(properties, body)
+        if data.get("reservation_id") is None:
+            ch.basic_ack(method.delivery_tag)
+            return
         id = int(data.get("reservation_id"))
         print(f"[Itinerary MS] Processing cancellation/decline for reservation ID: {id}")
-        print(self.reservations.get(id))
-        itinerary_id = self.reservations.get(id, {}).get("itinerary_id")
-        passengers = self.reservations.get(id, {}).get("passengers", 1)
 
-
-        if itinerary_id in self.all_itineraries:
-            self.all_itineraries[itinerary_id]["available_cabins"] = min(
-                self.all_itineraries[itinerary_id]["available_cabins"] + passengers,
-                self.all_itineraries[itinerary_id]["total_cabins"]
-            )
-            print(f"[Itinerary MS] Updated availability for itinerary {itinerary_id}: {self.all_itineraries[itinerary_id]['available_cabins']} available cabins.")
+        self.holds.cancel(id)
+        released = self.inventory.cancel(id)
+        if released is not None:
+            itinerary_id, available = released
+            print(f"[Itinerary MS] Updated availability for itinerary {itinerary_id}: {available} available cabins.")
         else:
-            print(f"[Itinerary MS] Itinerary {itinerary_id} not found for cancellation/declined.")
+            print(f"[Itinerary MS] Reservation {id} not found for cancellation/declined.")
         ch.basic_ack(method.delivery_tag)
 
+    def _cabins_changed(self, itinerary_id):
+        # Bumped right away, so no cached response (?id= lookups included) outlives the change
+        self._bump_version()
+        self.index_updater.changed(itinerary_id)
+
+    def _inventory_changed(self, itinerary_ids):
+        # Bumped again once the index reflects the change: searches cached in between saw the old index
+        self._bump_version()
+        if self._consumer_channel is not None:
+            for itinerary_id in itinerary_ids:
+                # pika channels are not thread-safe: publish from the connection thread
+                self._consumer_channel.connection.add_callback_threadsafe(lambda itinerary_id=itinerary_id: self._publish_inventory_changed(itinerary_id))
+
+    def _bump_version(self):
+        with self._version_lock:
+            self.inventory_version += 1
+
+    def _publish_inventory_changed(self, itinerary_id):
+        event = {
+            "itinerary_id": itinerary_id,
+            "available_cabins": self.inventory.available(itinerary_id),
+            "inventory_version": self.inventory_version
+        }
+        body, content_type = encode(event)
+        self._consumer_channel.basic_publish(exchange=INVENTORY_EXCHANGE, routing_key='', body=body, properties=Envelope(INVENTORY_CHANGED).properties(content_type))
+
+    def _publish_reservation_ended(self, envelope, itinerary_id, message):
+        # Called on the consumer thread; the Reservation MS moves the reservation to a terminal status
+        body, content_type = encode({"reservation_id": envelope.reservation_id, "itinerary_id": itinerary_id, "message": message})
+        self._consumer_channel.basic_publish(exchange='', routing_key=RESERVATION_EXPIRED_QUEUE, body=body, properties=envelope.properties(content_type))
+
     def _get_itinerary_id_from_request(self, id):
         return jsonify(self.all_itineraries.get(int(id), {"message": "Itinerary not found."})), 200
 
-    def _filter_itineraries(self, itinerary_request, itinerary_details):
-        print(itinerary_details)
-        match_destination = not itinerary_request.destination or itinerary_details["destination"].lower() == itinerary_request.destination.lower()
-        match_port = not itinerary_request.boarding_port or itinerary_details["departurePort"].lower() == itinerary_request.boarding_port.lower()
-        match_date = not itinerary_request.date or datetime.strptime(itinerary_details["departure"], "%Y-%m-%d").date() == itinerary_request.date
-        should_filter = itinerary_details["available_cabins"] > 0 or not any([itinerary_request.destination, itinerary_request.date, itinerary_request.boarding_port])
-        return  match_destination and match_port and match_date and should_filter
-    
     def run(self):
         print("[Itinerary MS] Starting Flask application on port 5003...")
         self.app.run(host='0.0.0.0', port=5003, debug=True, use_reloader=False)
@@ -0,0 +1,241 @@
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, date as date_type
+
+SORT_KEYS = ("departure", "price", "nights", "available_cabins")
+
+def encode_cursor(entry):
+    value, id = entry
+    if isinstance(value, date_type):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, id]).encode()).decode()
+
+def decode_cursor(cursor, sort):
+    # The value must compare with the sort index entries, or bisect fails later
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort == "departure":
+            value = datetime.strptime(value, "%Y-%m-%d").date()
+        elif isinstance(value, bool) or not isinstance(value, (float, int) if sort == "price" else int):
+            raise ValueError
+        if isinstance(id, bool) or not isinstance(id, int):
+            raise ValueError
+        return (value, id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.")
+
+class ItineraryIndex:
+    """Secondary indexes over the itinerary catalog.
+
+    Destination and boarding port are hash indexes (lower-cased key -> ids),
+    departure, price, nights and available cabins are sorted lists of
+    (value, id) pairs, and ``available`` holds the ids that still have cabins.
+    Queries intersect the matching id sets or walk one sorted index, so their
+    cost follows the size of the result instead of the catalog. Availability
+    updates and queries are serialized by an internal lock; the Itinerary MS
+    applies updates through an ``IndexUpdater`` so bookings never wait on it.
+    """
+
+    def __init__(self, itineraries):
+        self.itineraries = itineraries
+        self.by_destination = {}
+        self.by_port = {}
+        self.sorted = {key: [] for key in SORT_KEYS}
+        self.by_departure = self.sorted["departure"]
+        self.values = {}
+        self.available = set()
+        self.position = {}
+        self._lock = threading.RLock()
+        for itinerary in itineraries.values():
+            self.add(itinerary)
+
+    def add(self, itinerary):
+        id = itinerary["id"]
+        self.position[id] = len(self.position)
+        self.by_destination.setdefault(itinerary["destination"].lower(), set()).add(id)
+        self.by_port.setdefault(itinerary["departurePort"].lower(), set()).add(id)
+        self.values[id] = {
+            "departure": datetime.strptime(itinerary["departure"], "%Y-%m-%d").date(),
+            "price": itinerary["price"],
+            "nights": itinerary["nights"],
+            "available_cabins": itinerary.get("available_cabins", 0),
+        }
+        for key in SORT_KEYS:
+            insort(self.sorted[key], (self.values[id][key], id))
+        self.update_availability(id)
+
+    def update_availability_many(self, ids):
+        with self._lock:
+            for id in ids:
+                self.update_availability(id)
+
+    def update_availability(self, id):
+        with self._lock:
+            cabins = self.itineraries[id].get("available_cabins", 0)
+            old = self.values[id]["available_cabins"]
+            if cabins != old:
+                entries = self.sorted["available_cabins"]
+                del entries[bisect_left(entries, (old, id))]
+                insort(entries, (cabins, id))
+                self.values[id]["available_cabins"] = cabins
+
+            if cabins > 0:
+                self.available.add(id)
+            else:
+                self.available.discard(id)
+
+    def ids_departing_between(self, start=None, end=None):
+        low = bisect_left(self.by_departure, (start,)) if start else 0
+        high = bisect_right(self.by_departure, (end, float("inf"))) if end else len(self.by_departure)
+        return {id for _, id in self.by_departure[low:high]}
+
+    def search(self, destination=None, date=None, boarding_port=None):
+        with self._lock:
+            if not any([destination, date, boarding_port]):
+                return list(self.itineraries.values())
+
+            candidates = [self.available]
+            if destination:
+                candidates.append(self.by_destination.get(destination.lower(), set()))
+            if boarding_port:
+                candidates.append(self.by_port.get(boarding_port.lower(), set()))
+            if date:
+                candidates.append(self.ids_departing_between(date, date))
+
+            candidates.sort(key=len)
+            ids = set(candidates[0]).intersection(*candidates[1:])
+            return [self.itineraries[id] for id in sorted(ids, key=self.position.__getitem__)]
+
+    def query(self, query):
+        """Return ``(items, next_cursor)`` for an ``request_dto.Itinerary`` query.
+
+        Without ``limit``/``cursor`` the whole match is returned (``next_cursor``
+        is None), in ``query.sort`` order if given and catalog order otherwise.
+        Otherwise one page is returned in ``query.sort`` order, resuming after
+        ``query.cursor``.
+        """
+        with self._lock:
+            if not query.is_paginated():
+                items = self.search(query.destination, query.date, query.boarding_port)
+                if query.has_filters():
+                    items = [item for item in items if item["id"] in self.available and self._in_ranges(item["id"], query)]
+                if query.sort:
+                    items.sort(key=lambda item: (self.values[item["id"]][query.sort], item["id"]), reverse=query.descending)
+                return items, None
+
+            entries = self._entries_for(query)
+            bounds = self._ranges(query)[query.sort]
+            low, high = bisect_left(entries, (bounds[0],)) if bounds[0] is not None else 0, len(entries)
+            if bounds[1] is not None:
+                high = bisect_right(entries, (bounds[1], float("inf")))
+            if query.cursor:
+                after = decode_cursor(query.cursor, query.sort)
+                if query.descending:
+                    high = min(high, bisect_left(entries, after))
+                else:
+                    low = max(low, bisect_right(entries, after))
+
+            positions = range(high - 1, low - 1, -1) if query.descending else range(low, high)
+            page = []
+            for i in positions:
+                if self._matches(entries[i][1], query):
+                    page.append(entries[i])
+                    if len(page) > query.limit:
+                        break
+
+            next_cursor = encode_cursor(page[query.limit - 1]) if len(page) > query.limit else None
+            return [self.itineraries[id] for _, id in page[:query.limit]], next_cursor
+
+    def _entries_for(self, query):
+        # With an exact destination/port/date filter the candidate set is
+        # small: sort just those ids instead of walking the whole index.
+        hashed = []
+        if query.destination:
+            hashed.append(self.by_destination.get(query.destination.lower(), set()))
+        if query.boarding_port:
+            hashed.append(self.by_port.get(query.boarding_port.lower(), set()))
+        if query.date:
+            hashed.append(self.ids_departing_between(query.date, query.date))
+        if not hashed:
+            return self.sorted[query.sort]
+
+        hashed.sort(key=len)
+        ids = set(hashed[0]).intersection(*hashed[1:])
+        return sorted((self.values[id][query.sort], id) for id in ids)
+
+    def _ranges(self, query):
+        return {
+            "departure": (query.departure_from, query.departure_to),
+            "price": (query.price_min, query.price_max),
+            "nights": (query.nights_min, query.nights_max),
+            "available_cabins": (query.cabins_min, query.cabins_max),
+        }
+
+    def _matches(self, id, query):
+        if query.has_filters() and id not in self.available:
+            return False
+        if query.destination and id not in self.by_destination.get(query.destination.lower(), ()):
+            return False
+        if query.boarding_port and id not in self.by_port.get(query.boarding_port.lower(), ()):
+            return False
+        if query.date and self.values[id]["departure"] != query.date:
+            return False
+        return self._in_ranges(id, query)
+
+    def _in_ranges(self, id, query):
+        values = self.values[id]
+        for key, (low, high) in self._ranges(query).items():
+            if low is not None and values[key] < low:
+                return False
+            if high is not None and values[key] > high:
+                return False
+        return True
+
+class IndexUpdater:
+    """Applies availability changes to an ``ItineraryIndex`` off the booking path.
+
+    ``changed(id)`` only records the id and wakes one background thread, so
+    reserve/release never wait on the index lock or on a running search. The
+    thread folds every pending id into the index in one locked pass (an id
+    changed several times in between is applied once), then calls
+    ``on_applied(ids)``.
+    """
+
+    def __init__(self, index, on_applied=None):
+        self.index = index
+        self.on_applied = on_applied
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        threading.Thread(target=self._run, name="index-updater", daemon=True).start()
+
+    def changed(self, id):
+        with self._lock:
+            # Only the first change of a batch needs to wake the thread
+            wake = not self._pending
+            self._pending.add(id)
+        if wake:
+            self._wakeup.set()
+
+    def flush(self):
+        """Apply pending changes on the calling thread."""
+        self._apply()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self._apply()
+            except Exception as e:
+                print(f"[Itinerary Index] Failed to apply availability changes: {e}")
+
+    def _apply(self):
+        with self._lock:
+            ids, self._pending = self._pending, set()
+        if ids:
+            self.index.update_availability_many(ids)
+            if self.on_applied:
+                self.on_applied(ids)
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import threading
+import time
+from cryptography.hazmat.primitives import serialization
+from config import KEY_RELOAD_CHECK_INTERVAL
+
+PRIVATE_KEY_SUFFIX = "_private.pem"
+PUBLIC_KEY_SUFFIX = "_public.pem"
+
+def _public_der(key):
+    public_key = key.public_key() if hasattr(key, "public_key") else key
+    return public_key.public_bytes(serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+def key_id_for(key):
+    """Fingerprint of a key pair: SHA-256 of the public key (DER SubjectPublicKeyInfo)."""
+    return hashlib.sha256(_public_der(key)).hexdigest()
+
+class _CachedKey:
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self.key = None
+        self.key_id = None
+        self.stamp = None
+        self.checked_at = 0.0
+
+    def get(self, check_interval, force=False):
+        now = time.monotonic()
+        if self.key is not None and not force and now - self.checked_at < check_interval:
+            return self.key
+
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self.stamp:
+            with open(self.path, "rb") as f:
+                self.key = self.loader(f.read())
+            self.key_id = key_id_for(self.key)
+            self.stamp = stamp
+            if self.checked_at:
+                print(f"[Key Registry] Reloaded key {self.key_id[:12]} from {self.path}")
+        self.checked_at = now
+        return self.key
+
+class KeyRegistry:
+    """Keeps parsed signing/verification keys in memory, indexed by key id.
+
+    Keys are read from disk the first time they are used and only re-read
+    when the file's mtime or size changes, checked at most once every
+    ``check_interval`` seconds. A key id is the fingerprint of the public
+    key, so replacing a key file in place gives the new key a new id.
+    Public keys stay indexed by id after their file changes, so messages
+    signed with a previous key keep verifying during rotation. An unknown
+    id triggers a re-read of every ``*_public.pem`` next to the reference
+    file, which picks up keys rotated into new files without a restart.
+    ``public_keys``/``add_public_keys`` hand the known public keys to
+    another process (e.g. verification workers started after a rotation).
+    """
+
+    def __init__(self, check_interval=KEY_RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._private_keys = {}
+        self._public_keys = {}
+        self._public_keys_by_id = {}
+        self._public_der_by_id = {}
+        self._scanned_at = None
+
+    def private_key(self, file_name):
+        return self.signing_key(file_name)[0]
+
+    def signing_key(self, file_name):
+        """``(private_key, key_id)`` read together, so a reload can't split them."""
+        with self._lock:
+            entry = self._entry(self._private_keys, file_name, _load_private_key)
+            return entry.key, entry.key_id
+
+    def public_key(self, file_name):
+        with self._lock:
+            return self._public_entry(file_name).key
+
+    def public_key_by_id(self, key_id, reference_file):
+        with self._lock:
+            key = self._public_keys_by_id.get(key_id)
+            if key is None:
+                self._scan(os.path.dirname(os.path.abspath(reference_file)))
+                key = self._public_keys_by_id.get(key_id)
+        if key is None:
+            raise KeyError(f"Unknown key id: {key_id}")
+        return key
+
+    def public_keys(self, file_name):
+        """DER public keys known to this process by id, the current key of ``file_name`` included."""
+        with self._lock:
+            self._public_entry(file_name)
+            return dict(self._public_der_by_id)
+
+    def add_public_keys(self, keys):
+        """Index ``{key_id: DER}`` public keys, e.g. from ``public_keys`` in another process."""
+        with self._lock:
+            for key_id, der in keys.items():
+                if key_id not in self._public_keys_by_id:
+                    self._public_keys_by_id[key_id] = serialization.load_der_public_key(der)
+                    self._public_der_by_id[key_id] = der
+
+    def _scan(self, directory):
+        # At most once per check_interval, so unknown ids can't force a disk read per message
+        now = time.monotonic()
+        if self._scanned_at is not None and now - self._scanned_at < self.check_interval:
+            return
+        self._scanned_at = now
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(PUBLIC_KEY_SUFFIX):
+                try:
+                    self._public_entry(os.path.join(directory, name), force=True)
+                except (OSError, ValueError) as e:
+                    print(f"[Key Registry] Skipping {name}: {e}")
+
+    def _public_entry(self, file_name, force=False):
+        entry = self._entry(self._public_keys, file_name, serialization.load_pem_public_key, force)
+        if entry.key_id not in self._public_keys_by_id:
+            self._public_keys_by_id[entry.key_id] = entry.key
+            self._public_der_by_id[entry.key_id] = _public_der(entry.key)
+        return entry
+
+    def _entry(self, cache, file_name, loader, force=False):
+        path = os.path.abspath(file_name)
+        entry = cache.get(path)
+        if entry is None:
+            entry = cache[path] = _CachedKey(path, loader)
+        entry.get(self.check_interval, force)
+        return entry
+
+def _load_private_key(data):
+    return serialization.load_pem_private_key(data, password=None)
+
+registry = KeyRegistry()
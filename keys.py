@@ -1,14 +1,26 @@
-from cryptography.hazmat.primitives.asymmetric import rsa
+import sys
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
 from cryptography.hazmat.primitives import serialization
+from config import RSA_SIGNATURE_ALGORITHM, ED25519_SIGNATURE_ALGORITHM
 
-def keys(name):
-    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+def generate_private_key(algorithm=RSA_SIGNATURE_ALGORITHM):
+    if algorithm == RSA_SIGNATURE_ALGORITHM:
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == ED25519_SIGNATURE_ALGORITHM:
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported signature algorithm: {algorithm}")
+
+def keys(name, algorithm=RSA_SIGNATURE_ALGORITHM):
+    private_key = generate_private_key(algorithm)
     public_key = private_key.public_key()
+    private_format = serialization.PrivateFormat.TraditionalOpenSSL
+    if algorithm == ED25519_SIGNATURE_ALGORITHM:
+        private_format = serialization.PrivateFormat.PKCS8
 
     with open(f"{name}_private.pem", "wb") as f:
         f.write(private_key.private_bytes(
             encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            format=private_format,
             encryption_algorithm=serialization.NoEncryption()
         ))
 
@@ -18,4 +30,7 @@ def keys(name):
             format=serialization.PublicFormat.SubjectPublicKeyInfo
         ))
 
-keys("payment")
+if __name__ == '__main__':
+    # python keys.py [name] [RSA-PKCS1v15-SHA256|Ed25519]
+    keys(sys.argv[1] if len(sys.argv) > 1 else "payment",
+         sys.argv[2] if len(sys.argv) > 2 else RSA_SIGNATURE_ALGORITHM)
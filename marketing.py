@@ -1,32 +1,42 @@
-import pika
+import sys
 import json
-import random
-from config import ITINERARIES_FILE, MARKETING_EXCHANGE
-import time
+from concurrent.futures import wait
+from config import ITINERARIES_FILE, MARKETING_EXCHANGE, MARKETING_CAMPAIGNS_FILE, PUBLISHER_CONFIRM_TIMEOUT
+from campaigns import CampaignEngine, load_campaigns
+from messages import Envelope, PROMOTION, promotion_routing_key
+from publisher import Publisher
 
-conn = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-ch = conn.channel()
-ch.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='direct')
+# Uso: python marketing.py [arquivo de campanhas] [duração em segundos]
+
+# Publica pelos loops de I/O do Publisher (confirmações em lote), não um basic_publish bloqueante por mensagem
+publisher = Publisher(setup=lambda channel: channel.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='topic'))
 
 with open(ITINERARIES_FILE, 'r') as file:
     itineraries = json.load(file)
-    destinations = [itinerary['destination'] for itinerary in itineraries]
+    destinations = sorted({itinerary['destination'] for itinerary in itineraries})
+
+properties = Envelope(PROMOTION).properties(content_type="text/plain")
+routing_keys = {destination: promotion_routing_key(destination) for destination in destinations}
+unconfirmed = []
+failed = 0
 
 def publish_promotion(destination, msg):
-    ch.basic_publish(exchange=MARKETING_EXCHANGE, routing_key=f'promotions', body=msg)
-    print(f"[Marketing] Promotion for {destination} published.")
+    unconfirmed.append(publisher.publish(MARKETING_EXCHANGE, routing_keys[destination], msg, properties))
 
-try:
-    while True:
-        random_itinerary = random.choice(itineraries)
-        random_destination = random_itinerary['destination']
-        current_time = time.strftime("%d/%m/%Y %H:%M:%S")
-        random_promotion = f"{random_destination} - {random_itinerary.get('promotion', 'Special offer!')} - {current_time}"
+def flush():
+    # Espera o broker confirmar o lote: as taxas reportadas são de promoções aceitas pelo RabbitMQ
+    global failed
+    futures = unconfirmed[:]
+    unconfirmed.clear()
+    done, not_done = wait(futures, timeout=PUBLISHER_CONFIRM_TIMEOUT)
+    failed += len(not_done) + sum(1 for future in done if future.exception() is not None)
 
-        publish_promotion(random_destination, random_promotion)
-        print(f"[Marketing] Promotion for {random_destination} sent: {random_promotion}")
-        
-        time.sleep(random.randint(7, 15))
-except KeyboardInterrupt:
+if __name__ == '__main__':
+    campaigns_file = sys.argv[1] if len(sys.argv) > 1 else MARKETING_CAMPAIGNS_FILE
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    campaigns = load_campaigns(campaigns_file, destinations)
+    print(f"[Marketing] Running {len(campaigns)} campaign(s) from {campaigns_file}.")
+    CampaignEngine(campaigns, itineraries, publish_promotion, flush).run(duration)
+    if failed:
+        print(f"[Marketing] {failed:,} promotions were not confirmed by the broker.")
     print("\n[Marketing] Promotion publishing stopped.")
-    conn.close()
@@ -0,0 +1,100 @@
+from dataclasses import dataclass
+from typing import Optional
+import pika
+
+SCHEMA_VERSION = 1
+
+# Message types (AMQP ``type`` property)
+RESERVATION_CREATED = "reservation.created"
+RESERVATION_CANCELLED = "reservation.cancelled"
+RESERVATION_EXPIRED = "reservation.expired"
+RESERVATION_REJECTED = "reservation.rejected"
+PAYMENT_APPROVED = "payment.approved"
+PAYMENT_DECLINED = "payment.declined"
+TICKET_ISSUED = "ticket.issued"
+PROMOTION = "marketing.promotion"
+INVENTORY_CHANGED = "inventory.changed"
+
+SCHEMA_VERSION_HEADER = "x-schema-version"
+RESERVATION_ID_HEADER = "x-reservation-id"
+CLIENT_ID_HEADER = "x-client-id"
+
+# Promotions are routed on the marketing topic exchange as promotions.<destination>
+ALL_PROMOTIONS_ROUTING_KEY = "promotions.*"
+
+def destination_key(destination):
+    """Normalized destination name, usable as one word of a topic routing key."""
+    return destination.strip().lower().replace(" ", "-").replace(".", "-")
+
+def promotion_routing_key(destination):
+    return f"promotions.{destination_key(destination)}"
+
+def correlation_id_for(reservation_id):
+    """All messages about one reservation share its correlation id."""
+    return f"reservation-{reservation_id}"
+
+def reservation_id_of(properties):
+    """Reservation id from a message's envelope headers, without decoding the body."""
+    headers = (properties.headers if properties is not None else None) or {}
+    return headers.get(RESERVATION_ID_HEADER)
+
+def _int_or_none(value):
+    return int(value) if value is not None else None
+
+@dataclass
+class Envelope:
+    """Routing metadata of an inter-service message, carried in AMQP
+    properties (``type``, ``correlation_id``) and headers, so consumers can
+    dispatch without parsing the body.
+    """
+    type: str
+    reservation_id: Optional[int] = None
+    client_id: Optional[int] = None
+    correlation_id: Optional[str] = None
+    schema_version: int = SCHEMA_VERSION
+
+    def __post_init__(self):
+        self.reservation_id = _int_or_none(self.reservation_id)
+        self.client_id = _int_or_none(self.client_id)
+        if self.correlation_id is None and self.reservation_id is not None:
+            self.correlation_id = correlation_id_for(self.reservation_id)
+
+    @classmethod
+    def from_properties(cls, properties, data=None, default_type=None):
+        """Read the envelope of a received message.
+
+        Messages from publishers that predate the envelope have no headers:
+        ``reservation_id``/``client_id`` are then taken from the decoded body
+        ``data`` and the type from ``default_type``.
+        """
+        headers = (properties.headers if properties is not None else None) or {}
+        data = data if isinstance(data, dict) else {}
+        reservation_id = headers.get(RESERVATION_ID_HEADER, data.get("reservation_id"))
+        client_id = headers.get(CLIENT_ID_HEADER, data.get("client_id"))
+        return cls(
+            type=(properties.type if properties is not None else None) or default_type,
+            reservation_id=_int_or_none(reservation_id),
+            client_id=_int_or_none(client_id),
+            correlation_id=properties.correlation_id if properties is not None else None,
+            schema_version=int(headers.get(SCHEMA_VERSION_HEADER, SCHEMA_VERSION)),
+        )
+
+    def reply(self, type):
+        """Envelope of an event caused by this one: same reservation, client and correlation id."""
+        return Envelope(type, self.reservation_id, self.client_id, self.correlation_id)
+
+    def headers(self):
+        headers = {SCHEMA_VERSION_HEADER: self.schema_version}
+        if self.reservation_id is not None:
+            headers[RESERVATION_ID_HEADER] = self.reservation_id
+        if self.client_id is not None:
+            headers[CLIENT_ID_HEADER] = self.client_id
+        return headers
+
+    def properties(self, content_type="application/json"):
+        return pika.BasicProperties(
+            type=self.type,
+            correlation_id=self.correlation_id,
+            content_type=content_type,
+            headers=self.headers(),
+        )
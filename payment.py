@@ -1,24 +1,35 @@
 import random
-import json
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from decimal import Decimal
 from datetime import datetime
 from flask import Flask, request, jsonify
 from dotenv import load_dotenv
-import requests
+from http_client import http
 from request_dto import PaymentRequest, PaymentPayload, PaymentResponse
 
 load_dotenv()
 from config import (
     PAYMENT_EXCHANGE, PAYMENT_APPROVED_QUEUE, PAYMENT_DECLINED_QUEUE,
-    ITINERARIES_FILE, PAYMENT_PRIVATE_KEY_FILE, EXTERNAL_PAYMENT_SYSTEM_URL
+    ITINERARIES_FILE, PAYMENT_PRIVATE_KEY_FILE, EXTERNAL_PAYMENT_SYSTEM_URL,
+    PUBLISHER_CONFIRM_TIMEOUT
 )
-from utils import load_itineraries, create_channel, sign_message
+from utils import load_itineraries, create_signed_message
+from publisher import Publisher, PublishTimeoutError
+from idempotency import IdempotencyStore, request_fingerprint
+from codec import encode
+from messages import Envelope, PAYMENT_APPROVED, PAYMENT_DECLINED
 
 class PaymentService:
     def __init__(self):
         self.app = Flask(__name__)
         self.itineraries = load_itineraries(ITINERARIES_FILE)
-        self.channel = create_channel()
-        self.channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
+        self.publisher = Publisher(setup=lambda channel: channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct'))
+        # Retried link requests and redelivered webhooks get the stored response
+        self.idempotency = IdempotencyStore()
+        # Webhook key -> publish future still waiting for its broker confirm
+        self._unconfirmed = {}
+        self._unconfirmed_lock = threading.Lock()
         self._register_routes()
     
     def request_payment_link(self):
@@ -26,46 +37,109 @@ class PaymentService:
         try:
             data = self._load_data_or_cry()
             print(data)
-            transaction_id = f"PAY-{random.randint(100000, 999999)}"
-            print(f"[Payment API] Sending payment request to external system: {EXTERNAL_PAYMENT_SYSTEM_URL}")
-            payload = self._create_payload(PaymentRequest.from_dict(data), transaction_id)
-            response = requests.post(EXTERNAL_PAYMENT_SYSTEM_URL, json=payload)
-            response.raise_for_status()
-            
-            return self._create_response(response, transaction_id), 200
+            key = self._link_idempotency_key(data)
+            if key is None:
+                status, body = self._request_external_payment_link(data)
+            else:
+                status, body = self.idempotency.run(
+                    key, lambda: self._request_external_payment_link(data), request_fingerprint(data)
+                )
+            return jsonify(body), status
         except Exception as e:
             print(f"[Payment API ERROR] Unexpected error: {e}")
             return jsonify({"error": "Unexpected error occurred"}), 500
 
+    def _request_external_payment_link(self, data):
+        transaction_id = f"PAY-{random.randint(100000, 999999)}"
+        print(f"[Payment API] Sending payment request to external system: {EXTERNAL_PAYMENT_SYSTEM_URL}")
+        payload = self._create_payload(PaymentRequest.from_dict(data), transaction_id)
+        response = http.post(EXTERNAL_PAYMENT_SYSTEM_URL, json=payload)
+        response.raise_for_status()
+        return 200, self._create_response(response, transaction_id)
+
     def receive_payment_webhook(self):
         try:
             data = self._load_data_or_cry()
             print(f"[Payment Webhook] Received data: {data}")
             payload = PaymentPayload.from_dict(data)
             print(f"[Payment Webhook] Received payment notification: {payload}")
-            message_content = {
-                "transaction_id": payload.transaction_id,
-                "amount": payload.amount.quantize(0.01),
-                "currency": payload.currency,
-                "client_id": payload.client_id,
-                "itinerary_id": payload.itinerary_id,
-                "status": payload.status,
-            }
-            self.channel.basic_publish(
-                exchange=PAYMENT_EXCHANGE,
-                routing_key=self._get_routing_key(payload.status),
-                body=json.dumps(message_content)
+            key = f"webhook:{payload.transaction_id}:{payload.status}"
+            fingerprint = request_fingerprint(data)
+            status, body = self.idempotency.run(
+                key, lambda: self._publish_payment_event(payload, key, fingerprint), fingerprint
             )
-            print(f"[Payment] Message published")
         except Exception as e:
             print(f"[Payment Error] Failed to publish message to RabbitMQ: {e}")
             return jsonify({"error": "Internal server error during message publishing"}), 500
 
-        return jsonify({"message": f"Payment notification received and processed: {payload.status}"}), 200
+        return jsonify(body), status
+
+    def _publish_payment_event(self, payload, key, fingerprint):
+        response = {"message": f"Payment notification received and processed: {payload.status}"}
+        with self._unconfirmed_lock:
+            future = self._unconfirmed.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                # Signed like payment_.py's events, so consumers (Ticket MS) can verify it
+                message_content = {
+                    **create_signed_message(f"Payment {payload.status} for transaction {payload.transaction_id}.", PAYMENT_PRIVATE_KEY_FILE),
+                    "transaction_id": payload.transaction_id,
+                    "amount": str(payload.amount.quantize(Decimal("0.01"))),
+                    "currency": payload.currency,
+                    "client_id": payload.client_id,
+                    "itinerary_id": payload.itinerary_id,
+                    "status": payload.status,
+                    "reservation_id": payload.reservation_id,
+                    "passengers": payload.passengers,
+                }
+                body, content_type = encode(message_content)
+                future = self.publisher.publish(
+                    exchange=PAYMENT_EXCHANGE,
+                    routing_key=self._get_routing_key(payload.status),
+                    body=body,
+                    properties=self._create_envelope(payload).properties(content_type)
+                )
+                self._unconfirmed[key] = future
+            else:
+                # A redelivery of a webhook whose publish timed out: wait for
+                # that message instead of publishing the event a second time
+                print(f"[Payment] Waiting for earlier publish of {key}")
+        # Only answer the webhook once the broker has confirmed the message
+        try:
+            future.result(PUBLISHER_CONFIRM_TIMEOUT)
+        except FutureTimeoutError:
+            # Still queued in the Publisher: remember the response once it is
+            # confirmed, so later redeliveries neither wait nor republish
+            future.add_done_callback(lambda done: self._publish_confirmed(key, done, response, fingerprint))
+            raise PublishTimeoutError(f"No confirm for {key} after {PUBLISHER_CONFIRM_TIMEOUT}s")
+        except Exception:
+            self._forget_unconfirmed(key, future)
+            raise
+        self._forget_unconfirmed(key, future)
+        print(f"[Payment] Message published")
+        return 200, response
+
+    def _publish_confirmed(self, key, future, response, fingerprint):
+        if future.exception() is None:
+            # Store before forgetting the future, so a redelivery sees one or the other
+            self.idempotency.put(key, 200, response, fingerprint)
+        self._forget_unconfirmed(key, future)
+
+    def _forget_unconfirmed(self, key, future):
+        with self._unconfirmed_lock:
+            if self._unconfirmed.get(key) is future:
+                del self._unconfirmed[key]
+
+    def idempotency_stats(self):
+        return jsonify(self.idempotency.stats()), 200
+
+    def publisher_stats(self):
+        return jsonify(self.publisher.stats()), 200
 
     def _register_routes(self):
         self.app.add_url_rule('/payments/request-link', view_func=self.request_payment_link, methods=['POST'])
         self.app.add_url_rule('/payments/webhook', view_func=self.receive_payment_webhook, methods=['POST'])
+        self.app.add_url_rule('/payments/idempotency-stats', view_func=self.idempotency_stats, methods=['GET'])
+        self.app.add_url_rule('/payments/publisher-stats', view_func=self.publisher_stats, methods=['GET'])
 
     def _load_data_or_cry(self):
         data = request.get_json()
@@ -73,17 +147,29 @@ class PaymentService:
             raise ValueError("Invalid JSON data received")
         return data
     
+    def _link_idempotency_key(self, data):
+        # Idempotency-Key header if the client sends one, else the reservation id
+        if request.headers.get("Idempotency-Key"):
+            return f"link:{request.headers['Idempotency-Key']}"
+        if data.get("reservation_id") is not None:
+            return f"link:reservation:{data['reservation_id']}"
+        return None
+
     def _create_response(self, response, transaction_id):
-        return jsonify(PaymentResponse.from_dict(
+        return PaymentResponse.from_dict(
             response.json(),
             transaction_id, 
             "Payment link generated successfully by external system.",
             "pending_external_confirmation"
-        ).to_dict())
+        ).to_dict()
     
     def _create_payload(self, request, transaction_id):
         return PaymentPayload.from_request(request, transaction_id).to_dict()
 
+    def _create_envelope(self, payload):
+        message_type = PAYMENT_APPROVED if payload.status == 'approved' else PAYMENT_DECLINED
+        return Envelope(message_type, payload.reservation_id, payload.client_id)
+
     def _get_routing_key(self, status):
         routing_map = {
             'approved': PAYMENT_APPROVED_QUEUE,
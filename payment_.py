@@ -1,7 +1,8 @@
 import random
-import json
 from config import PAYMENT_EXCHANGE, PAYMENT_APPROVED_QUEUE, PAYMENT_DECLINED_QUEUE, RESERVATION_CREATED_QUEUE, ITINERARIES_FILE, PAYMENT_PRIVATE_KEY_FILE
-from utils import load_itineraries, create_channel, sign_message
+from utils import load_itineraries, create_channel, create_signed_message
+from codec import encode, decode_message
+from messages import Envelope, RESERVATION_CREATED, PAYMENT_APPROVED, PAYMENT_DECLINED
 from datetime import datetime
 
 itineraries = load_itineraries(ITINERARIES_FILE)
@@ -13,25 +14,28 @@ for queue in [RESERVATION_CREATED_QUEUE]:
     ch.queue_declare(queue=queue)
 
 def handle_reservation(ch, method, properties, body):
-    data = json.loads(body)
+    data = decode_message(properties, body)
     itinerary = itineraries[int(data["itinerary_id"])]
     status = 'denied'
     routing_key = PAYMENT_DECLINED_QUEUE
+    message_type = PAYMENT_DECLINED
     if random.choice([True, False]):
         status = 'approved'
         routing_key = PAYMENT_APPROVED_QUEUE
+        message_type = PAYMENT_APPROVED
+    envelope = Envelope.from_properties(properties, {"reservation_id": data.get("id"), "client_id": data.get("client_id")}, RESERVATION_CREATED).reply(message_type)
 
     message = f'Payment {status} for {itinerary["destination"]} on ship {itinerary["ship"]}.'
-    ch.basic_publish(exchange=PAYMENT_EXCHANGE, routing_key=routing_key, body=json.dumps(create_signed_message(message)))
+    body, content_type = encode({
+        **create_signed_message(message, PAYMENT_PRIVATE_KEY_FILE),
+        "reservation_id": data.get("id"),
+        "client_id": data.get("client_id"),
+        "itinerary_id": data.get("itinerary_id"),
+        "passengers": data.get("passengers"),
+    })
+    ch.basic_publish(exchange=PAYMENT_EXCHANGE, routing_key=routing_key, body=body, properties=envelope.properties(content_type))
     print(f"[Payment] [{datetime.now().isoformat()}] {message}")
 
-def create_signed_message(message):
-    return {
-        "timestamp": datetime.now().isoformat(),
-        "message": message,
-        "signature": sign_message(message, PAYMENT_PRIVATE_KEY_FILE)
-    }
-
 ch.basic_consume(queue=RESERVATION_CREATED_QUEUE, on_message_callback=handle_reservation, auto_ack=True)
 print("[Payment] Waiting for reservations...")
 ch.start_consuming()
@@ -0,0 +1,66 @@
+import threading
+from messages import destination_key
+
+ALL_DESTINATIONS = "*"
+
+class PromotionSubscriptions:
+    """Promotion subscribers indexed by destination and by client.
+
+    A client subscribes to specific destinations or to ``ALL_DESTINATIONS``.
+    ``destinations()`` is the set of destinations with at least one
+    subscriber, i.e. the routing keys the Reservation MS must be bound to.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_destination = {}
+        self._by_client = {}
+
+    def subscribe(self, client_id, destinations=None):
+        keys = self._keys(destinations)
+        with self._lock:
+            for key in keys:
+                self._by_destination.setdefault(key, set()).add(client_id)
+            self._by_client.setdefault(client_id, set()).update(keys)
+            return set(self._by_client[client_id])
+
+    def unsubscribe(self, client_id, destinations=None):
+        """Remove some (or, without ``destinations``, all) of a client's subscriptions.
+
+        Returns False if the client had none of them.
+        """
+        with self._lock:
+            subscribed = self._by_client.get(client_id)
+            if not subscribed:
+                return False
+            keys = subscribed & self._keys(destinations) if destinations else set(subscribed)
+            if not keys:
+                return False
+            for key in keys:
+                clients = self._by_destination[key]
+                clients.discard(client_id)
+                if not clients:
+                    del self._by_destination[key]
+            subscribed -= keys
+            if not subscribed:
+                del self._by_client[client_id]
+            return True
+
+    def is_subscribed(self, client_id):
+        return client_id in self._by_client
+
+    def has_subscribers(self, destination):
+        return destination in self._by_destination
+
+    def destinations(self):
+        with self._lock:
+            return set(self._by_destination)
+
+    def destinations_for(self, client_id):
+        with self._lock:
+            return set(self._by_client.get(client_id, ()))
+
+    def _keys(self, destinations):
+        if not destinations:
+            return {ALL_DESTINATIONS}
+        return {destination_key(destination) for destination in destinations}
@@ -0,0 +1,192 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import pika
+from pika.exceptions import AMQPError
+from config import (
+    RABBITMQ_HOST, PUBLISHER_CONNECTIONS, PUBLISHER_BATCH_SIZE, PUBLISHER_MAX_IN_FLIGHT,
+    PUBLISHER_CONFIRM_TIMEOUT, PUBLISHER_RECONNECT_DELAY
+)
+
+class PublishNackedError(AMQPError):
+    """The broker refused (nacked) a published message."""
+
+class PublishTimeoutError(AMQPError):
+    """The broker did not confirm a published message in time."""
+
+class _PublisherConnection:
+    """One connection and confirm-mode channel, driven by its own I/O loop thread.
+
+    Everything except ``wake`` runs on the I/O loop thread. Published
+    messages stay in ``outstanding`` (by delivery tag) until the broker
+    confirms them; if the connection drops they go back to the publisher's
+    queue and are sent again on the next connection.
+    """
+
+    def __init__(self, publisher, name):
+        self.publisher = publisher
+        self.name = name
+        self.connection = None
+        self.channel = None
+        self.outstanding = {}
+        self.next_tag = 1
+        self._wake_pending = False
+        self._wake_lock = threading.Lock()
+        threading.Thread(target=self._run, name=name, daemon=True).start()
+
+    def wake(self):
+        """Ask the I/O loop to drain the queue; False if not connected."""
+        connection = self.connection
+        if self.channel is None or connection is None:
+            return False
+        with self._wake_lock:
+            if self._wake_pending:
+                return True
+            self._wake_pending = True
+        try:
+            connection.ioloop.add_callback_threadsafe(self._drain)
+        except Exception:
+            with self._wake_lock:
+                self._wake_pending = False
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            self.connection = pika.SelectConnection(
+                pika.ConnectionParameters(host=self.publisher.host),
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_error,
+                on_close_callback=self._on_connection_closed
+            )
+            self.connection.ioloop.start()
+            time.sleep(self.publisher.reconnect_delay)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_error(self, connection, error):
+        print(f"[Publisher] {self.name}: connection failed: {error}")
+        connection.ioloop.stop()
+
+    def _on_connection_closed(self, connection, reason):
+        self.channel = None
+        self._requeue_outstanding()
+        print(f"[Publisher] {self.name}: connection closed: {reason}")
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel):
+        channel.add_on_close_callback(self._on_channel_closed)
+        if self.publisher.setup is not None:
+            self.publisher.setup(channel)
+        channel.confirm_delivery(ack_nack_callback=self._on_confirm, callback=lambda frame: self._on_confirm_mode(channel))
+
+    def _on_confirm_mode(self, channel):
+        self.next_tag = 1
+        self.channel = channel
+        self._drain()
+
+    def _on_channel_closed(self, channel, reason):
+        self.channel = None
+        self._requeue_outstanding()
+        if self.connection.is_open:
+            self.connection.close()
+
+    def _drain(self):
+        with self._wake_lock:
+            self._wake_pending = False
+        pending = self.publisher._pending
+        for _ in range(self.publisher.batch_size):
+            if self.channel is None or len(self.outstanding) >= self.publisher.max_in_flight:
+                return
+            try:
+                message = pending.get_nowait()
+            except queue.Empty:
+                return
+            exchange, routing_key, body, properties, _ = message
+            try:
+                self.channel.basic_publish(exchange, routing_key, body, properties)
+            except Exception as e:
+                print(f"[Publisher] {self.name}: publish failed, will retry: {e}")
+                pending.put(message)
+                return
+            self.outstanding[self.next_tag] = message
+            self.next_tag += 1
+        # Full batch sent: let the loop read confirms before sending more
+        self.connection.ioloop.call_later(0, self._drain)
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        if method.multiple:
+            tags = list(itertools.takewhile(lambda tag: tag <= method.delivery_tag, self.outstanding))
+        else:
+            tags = [method.delivery_tag]
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        for tag in tags:
+            message = self.outstanding.pop(tag, None)
+            if message is None:
+                continue
+            if acked:
+                message[4].set_result(True)
+            else:
+                message[4].set_exception(PublishNackedError(f"Message to {message[0]!r}/{message[1]!r} was nacked by the broker"))
+        self._drain()
+
+    def _requeue_outstanding(self):
+        for message in self.outstanding.values():
+            self.publisher._pending.put(message)
+        self.outstanding.clear()
+
+class Publisher:
+    """Thread-safe RabbitMQ publisher for Flask request threads.
+
+    ``publish`` can be called from any thread: messages go through a queue
+    to a small pool of connections, each publishing in confirm mode from its
+    own I/O loop thread without waiting per message, so one confirm (often
+    acking several deliveries) costs no extra round trip. Connections are
+    re-opened transparently and unconfirmed messages are sent again, so
+    delivery is at-least-once: a message can reach its queue twice, and
+    consumers must treat redeliveries as duplicates (e.g. by reservation id).
+    ``setup(channel)`` declares exchanges/queues on every new channel.
+    """
+
+    def __init__(self, setup=None, connections=PUBLISHER_CONNECTIONS, batch_size=PUBLISHER_BATCH_SIZE,
+                 max_in_flight=PUBLISHER_MAX_IN_FLIGHT, host=RABBITMQ_HOST, reconnect_delay=PUBLISHER_RECONNECT_DELAY):
+        self.setup = setup
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.host = host
+        self.reconnect_delay = reconnect_delay
+        self._pending = queue.Queue()
+        self._workers = [_PublisherConnection(self, f"publisher-{i}") for i in range(connections)]
+        self._counter = itertools.count()
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        """Queue a message; the returned future resolves when the broker confirms it."""
+        future = Future()
+        self._pending.put((exchange, routing_key, body, properties, future))
+        start = next(self._counter)
+        for i in range(len(self._workers)):
+            if self._workers[(start + i) % len(self._workers)].wake():
+                break
+        # Not connected anywhere: sent as soon as a connection is (re)opened
+        return future
+
+    def publish_and_wait(self, exchange, routing_key, body, properties=None, timeout=PUBLISHER_CONFIRM_TIMEOUT):
+        """Publish and block until confirmed. On PublishTimeoutError the
+        message is still queued and may be delivered later; a caller that
+        retries can therefore publish it twice.
+        """
+        try:
+            return self.publish(exchange, routing_key, body, properties).result(timeout)
+        except FutureTimeoutError:
+            raise PublishTimeoutError(f"No confirm for message to {exchange!r}/{routing_key!r} after {timeout}s")
+
+    def stats(self):
+        return {
+            "pending": self._pending.qsize(),
+            "in_flight": sum(len(worker.outstanding) for worker in self._workers),
+            "connected": sum(worker.channel is not None for worker in self._workers),
+        }
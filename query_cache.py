@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from config import ITINERARY_CACHE_SIZE
+
+class QueryCache:
+    """Bounded, thread-safe LRU cache of query responses.
+
+    Every entry can remember the ``version`` it was computed at; a lookup
+    with another version is a miss, so e.g. responses never outlive an
+    inventory version change. Entries also expire ``ttl`` seconds after
+    being stored (if given) and can carry ``tags`` naming what they depend
+    on. ``changed(tag)`` evicts the entries with that tag and refuses any
+    ``put(..., since=...)`` of a response computed before the change: read
+    ``sequence()`` before computing and pass it as ``since``, so a response
+    racing with an update is never stored. Stale entries are otherwise
+    simply pushed out by the LRU bound.
+    """
+
+    def __init__(self, max_size=ITINERARY_CACHE_SIZE, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (version, expires, tags, value)
+        self._entries = OrderedDict()
+        self._by_tag = {}
+        # tag -> sequence number of its last change (one per tag ever changed)
+        self._changed_at = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+                self._remove(key)
+                entry = None
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[3]
+
+    def put(self, key, value, version=None, tags=(), since=None):
+        """Store ``value``; returns False if a tag changed after sequence ``since``."""
+        with self._lock:
+            if since is not None and any(self._changed_at.get(tag, 0) > since for tag in tags):
+                return False
+            self._remove(key)
+            expires = self.clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (version, expires, tuple(tags), value)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+            return True
+
+    def update(self, key, fields):
+        """Merge ``fields`` into a cached dict value; returns False if ``key`` is not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._entries[key] = entry[:3] + ({**entry[3], **fields},)
+            return True
+
+    def sequence(self):
+        with self._lock:
+            return self._sequence
+
+    def changed(self, tag, evict=True):
+        """Record a change of ``tag``: evict its entries (unless ``evict`` is False) and refuse older puts."""
+        with self._lock:
+            self._sequence += 1
+            self._changed_at[tag] = self._sequence
+            if evict:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
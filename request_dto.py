@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, astuple, replace
 from typing import Optional
 from decimal import Decimal
 from datetime import date, datetime
+from config import ITINERARY_PAGE_SIZE, ITINERARY_MAX_PAGE_SIZE
 
 @dataclass
 class PaymentRequest:
@@ -10,6 +11,7 @@ class PaymentRequest:
     total_price: Decimal
     client_id: int
     currency: str = "USD"
+    reservation_id: Optional[int] = None
 
     def from_dict(data: dict) -> "PaymentRequest":
         instance = PaymentRequest(
@@ -17,7 +19,8 @@ class PaymentRequest:
             passengers=data.get("passengers", 1),
             total_price=Decimal(data.get("total_price", 0)),
             client_id=data.get("client_id", 0),
-            currency=data.get("currency", "USD")
+            currency=data.get("currency", "USD"),
+            reservation_id=data.get("reservation_id")
         )
         instance._validate_data(data)
         return instance
@@ -37,6 +40,8 @@ class PaymentRequest:
             raise ValueError("client_id must be a number.")
         if "currency" in data and not isinstance(data["currency"], str):
             raise ValueError("currency must be a string.")
+        if data.get("reservation_id") is not None and not isinstance(data["reservation_id"], int):
+            raise ValueError("reservation_id must be an integer.")
 
 @dataclass
 class PaymentPayload:
@@ -46,6 +51,8 @@ class PaymentPayload:
     client_id: int
     itinerary_id: int
     status: str
+    reservation_id: Optional[int] = None
+    passengers: Optional[int] = None
 
     def from_request(request: PaymentRequest, transaction_id):
         return PaymentPayload(
@@ -54,7 +61,9 @@ class PaymentPayload:
             currency=request.currency,
             client_id=request.client_id,
             itinerary_id=request.itinerary_id,
-            status="pending_external_confirmation"
+            status="pending_external_confirmation",
+            reservation_id=request.reservation_id,
+            passengers=request.passengers
         )
 
     def from_dict(data: dict) -> "PaymentPayload":
@@ -69,11 +78,13 @@ class PaymentPayload:
             currency=data["currency"],
             client_id=data["client_id"],
             itinerary_id=data["itinerary_id"],
-            status=data["status"]
+            status=data["status"],
+            reservation_id=data.get("reservation_id"),
+            passengers=data.get("passengers")
         )
 
     def to_dict(self) -> dict:
-        return {
+        payload = {
             "transaction_id": self.transaction_id,
             "amount": str(self.amount),  # Convert Decimal to string for JSON serialization
             "currency": self.currency,
@@ -81,6 +92,11 @@ class PaymentPayload:
             "itinerary_id": self.itinerary_id,
             "status": self.status
         }
+        if self.reservation_id is not None:
+            payload["reservation_id"] = self.reservation_id
+        if self.passengers is not None:
+            payload["passengers"] = self.passengers
+        return payload
 
 @dataclass
 class PaymentResponse:
@@ -120,24 +136,96 @@ class PaymentResponse:
             response["external_transaction_id"] = self.external_transaction_id
         return response
 
+ITINERARY_SORT_KEYS = ("departure", "price", "nights", "available_cabins")
+
+def _parse_date(data: dict, key: str) -> Optional[date]:
+    if not data.get(key):
+        return None
+    try:
+        return datetime.strptime(data[key], "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{key} must be a date in YYYY-MM-DD format.")
+
+def _parse_number(data: dict, key: str, cast):
+    if data.get(key) in (None, ""):
+        return None
+    try:
+        return cast(data[key])
+    except ValueError:
+        raise ValueError(f"{key} must be a number.")
+
 @dataclass
 class Itinerary:
     destination: Optional[str] = ""
     date: Optional["date"] = None
     boarding_port: Optional[str] = ""
     id: Optional[int] = None
+    departure_from: Optional["date"] = None
+    departure_to: Optional["date"] = None
+    price_min: Optional[float] = None
+    price_max: Optional[float] = None
+    nights_min: Optional[int] = None
+    nights_max: Optional[int] = None
+    cabins_min: Optional[int] = None
+    cabins_max: Optional[int] = None
+    # None keeps catalog order; paginated queries default to "departure"
+    sort: Optional[str] = None
+    descending: bool = False
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
 
     def from_dict(data: dict) -> "Itinerary":
         if not isinstance(data, dict):
             raise ValueError("Data must be a dictionary.")
-        
-        return Itinerary(
+
+        sort = data.get("sort") or ""
+        instance = Itinerary(
             destination=data.get("destination", None),
-            date=datetime.strptime(data["departure"], "%Y-%m-%d").date() if "departure" in data else None,
+            date=_parse_date(data, "departure"),
             boarding_port=data.get("boarding_port", None),
-            id=data.get("id", None)
+            id=data.get("id", None),
+            departure_from=_parse_date(data, "departure_from"),
+            departure_to=_parse_date(data, "departure_to"),
+            price_min=_parse_number(data, "price_min", float),
+            price_max=_parse_number(data, "price_max", float),
+            nights_min=_parse_number(data, "nights_min", int),
+            nights_max=_parse_number(data, "nights_max", int),
+            cabins_min=_parse_number(data, "cabins_min", int),
+            cabins_max=_parse_number(data, "cabins_max", int),
+            sort=sort.lstrip("-") or None,
+            descending=sort.startswith("-"),
+            limit=_parse_number(data, "limit", int),
+            cursor=data.get("cursor") or None
         )
-    
+        instance._validate_data()
+        return instance
+
+    def _validate_data(self):
+        if self.sort is not None and self.sort not in ITINERARY_SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(ITINERARY_SORT_KEYS)} (prefix with '-' for descending).")
+        if self.limit is not None and self.limit <= 0:
+            raise ValueError("limit must be a positive integer.")
+        if self.is_paginated():
+            self.limit = min(self.limit or ITINERARY_PAGE_SIZE, ITINERARY_MAX_PAGE_SIZE)
+            self.sort = self.sort or "departure"
+
+    def is_paginated(self) -> bool:
+        return self.limit is not None or self.cursor is not None
+
+    def cache_key(self) -> tuple:
+        # Only the case-insensitive filters are normalized; cursors are case-sensitive base64
+        return astuple(replace(
+            self,
+            destination=self.destination.lower() if self.destination else self.destination,
+            boarding_port=self.boarding_port.lower() if self.boarding_port else self.boarding_port
+        ))
+
+    def has_filters(self) -> bool:
+        return any(value not in (None, "") for value in [
+            self.destination, self.date, self.boarding_port, self.departure_from, self.departure_to,
+            self.price_min, self.price_max, self.nights_min, self.nights_max, self.cabins_min, self.cabins_max
+        ])
+
     def to_dict(self) -> dict:
         return {
             "destination": self.destination,
@@ -145,4 +233,3 @@ class Itinerary:
             "boarding_port": self.boarding_port,
             "id": self.id
         }
-
@@ -1,11 +1,9 @@
-import json
 import threading
-import time
-import random
 from datetime import datetime
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, request, jsonify, url_for, send_file
 import pika
 import requests
+from http_client import http
 from flask_sse import sse
 from flask_cors import CORS 
 
@@ -13,9 +11,24 @@ from config import (
     RABBITMQ_HOST, RESERVATION_CREATED_QUEUE,
     PAYMENT_APPROVED_QUEUE, PAYMENT_DECLINED_QUEUE, TICKET_ISSUED_QUEUE,
     PAYMENT_EXCHANGE, TICKET_EXCHANGE, MARKETING_EXCHANGE,
-    PAYMENT_PUBLIC_KEY_FILE, RESERVATION_CANCELLED_QUEUE, ITINERARIES_FILE
+    RESERVATION_CANCELLED_QUEUE, RESERVATION_EXPIRED_QUEUE, ITINERARIES_FILE, INVENTORY_EXCHANGE,
+    RESERVATION_ITINERARY_CACHE_SIZE, RESERVATION_ITINERARY_CACHE_TTL, RESERVATION_SEARCH_CACHE_SIZE
 )
-from utils import create_channel, verify_signature, load_itineraries # load_itineraries ainda é usado para carregar destinos para promoções
+from utils import create_channel, load_itineraries # load_itineraries ainda é usado para carregar destinos para promoções
+from verification import BatchVerifier, verify_payment_message
+from reservation_store import create_reservation_store
+from id_generator import SnowflakeGenerator, node_id_from_env
+from query_cache import QueryCache
+from publisher import Publisher
+from ticket_render import document_path, DOCUMENT_MIMETYPE
+from consumer_pool import ConsumerPool
+from codec import encode, decode_message
+from messages import (
+    Envelope, RESERVATION_CREATED, RESERVATION_CANCELLED, RESERVATION_EXPIRED, RESERVATION_REJECTED,
+    PAYMENT_APPROVED, PAYMENT_DECLINED, TICKET_ISSUED, PROMOTION,
+    ALL_PROMOTIONS_ROUTING_KEY, destination_key, promotion_routing_key, reservation_id_of
+)
+from promotion_subscriptions import PromotionSubscriptions, ALL_DESTINATIONS
 
 app = Flask(__name__)
 app.config["REDIS_URL"] = "redis://localhost"
@@ -26,15 +39,39 @@ MS_ITINERARIES_URL = "http://localhost:5003"
 MS_PAYMENT_URL = "http://localhost:5001"
 CORS(app)
 
-publish_channel = create_channel()
-publish_channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
-publish_channel.exchange_declare(exchange=TICKET_EXCHANGE, exchange_type='direct')
-publish_channel.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='direct')
-publish_channel.queue_declare(queue=RESERVATION_CREATED_QUEUE)
-publish_channel.queue_declare(queue=RESERVATION_CANCELLED_QUEUE)
-
-promotion_subscribers = []
-reservations = []
+def _declare_publish_topology(channel):
+    channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
+    channel.exchange_declare(exchange=TICKET_EXCHANGE, exchange_type='direct')
+    channel.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='topic')
+    channel.queue_declare(queue=RESERVATION_CREATED_QUEUE)
+    channel.queue_declare(queue=RESERVATION_CANCELLED_QUEUE)
+
+# Publicações vêm de várias threads do Flask: passam pelo Publisher (pool de
+# conexões com publisher confirms) em vez de um canal pika compartilhado
+publisher = Publisher(setup=_declare_publish_topology)
+
+consumer_pool = None
+# Inscrições em promoções por destino; a fila de promoções só é ligada
+# (binding) aos destinos com algum inscrito
+promotion_subscriptions = PromotionSubscriptions()
+promotion_queue = None
+promotion_bindings = set()  # só acessado na thread do consumidor
+reservations = create_reservation_store()
+reservation_ids = SnowflakeGenerator(node_id_from_env())
+# Itinerários por id e respostas de busca; atualizados pelos eventos do inventory-exchange.
+# Cada entrada leva como tags os ids dos itinerários de que depende (ver _search_tags)
+itinerary_cache = QueryCache(RESERVATION_ITINERARY_CACHE_SIZE, RESERVATION_ITINERARY_CACHE_TTL)
+search_cache = QueryCache(RESERVATION_SEARCH_CACHE_SIZE, RESERVATION_ITINERARY_CACHE_TTL)
+# Buscas que filtram ou ordenam por número de cabines mudam a cada evento
+CABIN_COUNT_TAG = "cabin-counts"
+# Buscas filtradas omitem itinerários esgotados: mudam quando um esgota ou volta a ter cabines
+AVAILABILITY_TAG = "availability"
+SEARCH_FILTER_PARAMS = (
+    "destination", "departure", "boarding_port", "departure_from", "departure_to",
+    "price_min", "price_max", "nights_min", "nights_max", "cabins_min", "cabins_max"
+)
+# Últimas cabines disponíveis por itinerário (só na thread do consumidor de inventário)
+known_cabins = {}
 
 def _publish_sse_event(channel_name, event_type, message_data):
     try:
@@ -47,82 +84,166 @@ def _publish_sse_event(channel_name, event_type, message_data):
 def _get_client_status_channel(client_id):
     return f"reservation-status-{client_id}"
 
+# Canais SSE compartilhados: cada promoção é publicada uma vez no canal do
+# seu destino e uma vez no canal de quem quer todos os destinos
+PROMOTIONS_BROADCAST_CHANNEL = "promotions"
+
 def _get_promo_channel(client_id):
     return f"promotions-{client_id}"
 
-def _handle_payment_approved(ch, method, properties, body):
-    data = json.loads(body)
-    print(f"[Reservation MS - Consumer] Pagamento Aprovado: {data['message']}")
-    client_id = None
-    try: 
-        client_id_part = data['message'].split("from Client ")[1].split(" for itinerary")[0].strip()
-        if client_id_part: client_id = client_id_part
-    except (IndexError, ValueError): pass
-    
-    target_channel = _get_client_status_channel(client_id) if client_id else "general_reservation_status"
-    _publish_sse_event(target_channel, 'payment_approved', data)
-    ch.basic_ack(method.delivery_tag)
-
-def _handle_payment_declined(ch, method, properties, body):
-    data = json.loads(body)
-    message_to_verify = f"{data['timestamp']}|{data['message']}"
-    if verify_signature(message_to_verify, data["signature"], PAYMENT_PUBLIC_KEY_FILE):
-        print(f"[Reservation MS - Consumer] Pagamento Recusado: {data['message']}")
-        client_id = None
-        try:
-            client_id_part = data['message'].split("from Client ")[1].split(" for itinerary")[0].strip()
-            if client_id_part: client_id = client_id_part
-        except (IndexError, ValueError): pass
-
-        target_channel = _get_client_status_channel(client_id) if client_id else "general_reservation_status"
-        _publish_sse_event(target_channel, 'payment_declined', data)
+def _get_destination_promo_channel(destination):
+    if destination == ALL_DESTINATIONS:
+        return PROMOTIONS_BROADCAST_CHANNEL
+    return f"promotions-destination-{destination_key(destination)}"
+
+# Eventos de reserva por tipo de mensagem: (status da reserva, evento SSE, descrição)
+RESERVATION_EVENTS = {
+    PAYMENT_APPROVED: ("approved", "payment_approved", "Pagamento Aprovado"),
+    PAYMENT_DECLINED: ("declined", "payment_declined", "Pagamento Recusado"),
+    TICKET_ISSUED: ("ticket_issued", "ticket_issued", "Bilhete Emitido"),
+    # Publicados pelo Itinerary MS quando as cabines são liberadas sem pagamento
+    RESERVATION_EXPIRED: ("expired", "reservation_expired", "Reserva Expirada"),
+    RESERVATION_REJECTED: ("rejected", "reservation_rejected", "Reserva Sem Cabines"),
+}
+
+def _reservation_event_handler(default_type):
+    # default_type vale para mensagens de publicadores ainda sem envelope
+    def handle(ch, method, properties, body):
+        data = decode_message(properties, body)
+        envelope = Envelope.from_properties(properties, data, default_type)
+        status, event_type, description = RESERVATION_EVENTS[envelope.type]
+        reservation = None
+        if envelope.reservation_id is not None:
+            reservation = reservations.update_status(envelope.reservation_id, status)
+        client_id = envelope.client_id
+        if client_id is None and reservation is not None:
+            client_id = reservation["client_id"]
+        print(f"[Reservation MS - Consumer] {description}: reserva {envelope.reservation_id}, cliente {client_id}")
+        if data.get("document_id"):
+            data["ticket_url"] = f"/api/reserve/tickets/{data['document_id']}"
+
+        target_channel = _get_client_status_channel(client_id) if client_id is not None else "general_reservation_status"
+        _publish_sse_event(target_channel, event_type, data)
+    return handle
+
+def _handle_inventory_changed(ch, method, properties, body):
+    data = decode_message(properties, body)
+    itinerary_id = int(data["itinerary_id"])
+    cabins = data.get("available_cabins")
+    # changed() antes do update: respostas HTTP buscadas antes deste evento não entram mais no cache
+    if cabins is None:
+        itinerary_cache.changed(itinerary_id)
     else:
-        print("[Reservation MS - Consumer] Assinatura inválida para pagamento recusado. Ignorando.")
-    ch.basic_ack(method.delivery_tag)
-
-def _handle_ticket_issued(ch, method, properties, body):
-    data = json.loads(body)
-    print(f"[Reservation MS - Consumer] Bilhete Emitido: {data['message']}")
-    client_id = None
-    try:
-        client_id_part = data['message'].split("from Client ")[1].split(" for itinerary")[0].strip()
-        if client_id_part: client_id = client_id_part
-    except (IndexError, ValueError): pass
-
-    target_channel = _get_client_status_channel(client_id) if client_id else "general_reservation_status"
-    _publish_sse_event(target_channel, 'ticket_issued', data)
-    ch.basic_ack(method.delivery_tag)
+        itinerary_cache.changed(itinerary_id, evict=False)
+        itinerary_cache.update(itinerary_id, {"available_cabins": cabins})
+
+    # Só descarta as buscas afetadas por este itinerário
+    previous = known_cabins.get(itinerary_id)
+    known_cabins[itinerary_id] = cabins
+    search_cache.changed(itinerary_id)
+    search_cache.changed(CABIN_COUNT_TAG)
+    if cabins is None or previous is None or (previous > 0) != (cabins > 0):
+        search_cache.changed(AVAILABILITY_TAG)
+
+def _search_tags(params, result):
+    if isinstance(result, dict):
+        items = result["items"] if "items" in result else [result]
+    else:
+        items = result
+    tags = {item["id"] for item in items if isinstance(item, dict) and item.get("id") is not None}
+    if params.get("sort", "").lstrip("-") == "available_cabins" or "cabins_min" in params or "cabins_max" in params:
+        tags.add(CABIN_COUNT_TAG)
+    if any(params.get(name) for name in SEARCH_FILTER_PARAMS):
+        tags.add(AVAILABILITY_TAG)
+    return tags
+
+def _get_itinerary(itinerary_id):
+    itinerary_id = int(itinerary_id)
+    itinerary = itinerary_cache.get(itinerary_id)
+    if itinerary is None:
+        since = itinerary_cache.sequence()
+        response = http.get(f"{MS_ITINERARIES_URL}/itineraries?id={itinerary_id}")
+        response.raise_for_status()
+        itinerary = response.json()
+        if itinerary.get("id") is not None:
+            itinerary_cache.put(itinerary_id, itinerary, tags=(itinerary_id,), since=since)
+    return itinerary
 
 def _handle_promotion(ch, method, properties, body):
     message = body.decode()
     print(f"[Reservation MS - Consumer] Promoção Recebida: {message}")
 
-    for client_id in promotion_subscribers:
-        print(f"[Reservation MS - Consumer] Enviando promoção para cliente {client_id}...")
-        _publish_sse_event(_get_promo_channel(client_id), 'promotion', {"message": message})
-
-    ch.basic_ack(method.delivery_tag)
+    destination = method.routing_key.split(".", 1)[-1]
+    event = {"message": message, "destination": destination}
+
+    # Promoções personalizadas (com x-client-id) vão só para o canal do cliente
+    client_id = Envelope.from_properties(properties, default_type=PROMOTION).client_id
+    if client_id is not None:
+        if promotion_subscriptions.is_subscribed(client_id):
+            _publish_sse_event(_get_promo_channel(client_id), 'promotion', event)
+        return
+    for key in (destination, ALL_DESTINATIONS):
+        if promotion_subscriptions.has_subscribers(key):
+            _publish_sse_event(_get_destination_promo_channel(key), 'promotion', event)
+
+def _promotion_routing_key(destination):
+    return ALL_PROMOTIONS_ROUTING_KEY if destination == ALL_DESTINATIONS else promotion_routing_key(destination)
+
+def _sync_promotion_bindings():
+    # Roda na thread do consumidor: liga/desliga a fila de promoções para que
+    # o broker só entregue destinos com inscritos
+    channel = consumer_pool.channel
+    wanted = {_promotion_routing_key(destination) for destination in promotion_subscriptions.destinations()}
+    for routing_key in wanted - promotion_bindings:
+        channel.queue_bind(exchange=MARKETING_EXCHANGE, queue=promotion_queue, routing_key=routing_key)
+        promotion_bindings.add(routing_key)
+    for routing_key in promotion_bindings - wanted:
+        channel.queue_unbind(exchange=MARKETING_EXCHANGE, queue=promotion_queue, routing_key=routing_key)
+        promotion_bindings.discard(routing_key)
+
+def _request_promotion_bindings_sync():
+    if consumer_pool is not None and promotion_queue is not None:
+        consumer_pool.connection.add_callback_threadsafe(_sync_promotion_bindings)
 
 def start_rabbitmq_consumers():
+    global consumer_pool, promotion_queue
     consumer_channel = create_channel()
+    verifier = BatchVerifier(consumer_channel.connection)
+    # Handlers rodam em pools por fila (prefetch e concorrência em config.py);
+    # um Redis lento numa fila não trava as outras
+    pool = ConsumerPool(consumer_channel)
     
     consumer_channel.queue_declare(queue=PAYMENT_APPROVED_QUEUE)
     consumer_channel.queue_declare(queue=PAYMENT_DECLINED_QUEUE)
     consumer_channel.queue_declare(queue=TICKET_ISSUED_QUEUE)
     consumer_channel.queue_declare(queue=RESERVATION_CANCELLED_QUEUE)
     consumer_channel.queue_declare(queue=RESERVATION_CREATED_QUEUE)
+    consumer_channel.queue_declare(queue=RESERVATION_EXPIRED_QUEUE)
     consumer_channel.queue_bind(exchange=PAYMENT_EXCHANGE, queue=PAYMENT_APPROVED_QUEUE, routing_key=PAYMENT_APPROVED_QUEUE)
     consumer_channel.queue_bind(exchange=PAYMENT_EXCHANGE, queue=PAYMENT_DECLINED_QUEUE, routing_key=PAYMENT_DECLINED_QUEUE)
     consumer_channel.queue_bind(exchange=TICKET_EXCHANGE, queue=TICKET_ISSUED_QUEUE, routing_key=TICKET_ISSUED_QUEUE)
 
 
-    consumer_channel.basic_consume(queue=PAYMENT_APPROVED_QUEUE, on_message_callback=_handle_payment_approved, auto_ack=False)
-    consumer_channel.basic_consume(queue=PAYMENT_DECLINED_QUEUE, on_message_callback=_handle_payment_declined, auto_ack=False)
-    consumer_channel.basic_consume(queue=TICKET_ISSUED_QUEUE, on_message_callback=_handle_ticket_issued, auto_ack=False)
+    # Assinatura dos pagamentos recusados verificada pelo BatchVerifier; ack feito pelo ConsumerPool
+    # Várias threads por fila, mas os eventos de uma mesma reserva seguem em ordem (chave = reservation id)
+    pool.consume(PAYMENT_APPROVED_QUEUE, pool.wrap(PAYMENT_APPROVED_QUEUE, _reservation_event_handler(PAYMENT_APPROVED), key=reservation_id_of))
+    pool.consume(PAYMENT_DECLINED_QUEUE, verifier.wrap(PAYMENT_DECLINED_QUEUE, verify_payment_message, pool.wrap(PAYMENT_DECLINED_QUEUE, _reservation_event_handler(PAYMENT_DECLINED), key=reservation_id_of), ack=False))
+    pool.consume(TICKET_ISSUED_QUEUE, pool.wrap(TICKET_ISSUED_QUEUE, _reservation_event_handler(TICKET_ISSUED)))
+    pool.consume(RESERVATION_EXPIRED_QUEUE, pool.wrap(RESERVATION_EXPIRED_QUEUE, _reservation_event_handler(RESERVATION_EXPIRED)))
     
+    consumer_channel.exchange_declare(exchange=INVENTORY_EXCHANGE, exchange_type='fanout')
+    inventory_queue_name = consumer_channel.queue_declare(queue='', exclusive=True).method.queue
+    consumer_channel.queue_bind(exchange=INVENTORY_EXCHANGE, queue=inventory_queue_name)
+    pool.consume(inventory_queue_name, pool.wrap("inventory", _handle_inventory_changed), name="inventory")
+
+    consumer_channel.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='topic')
     promo_queue_name = consumer_channel.queue_declare(queue='', exclusive=True).method.queue
-    consumer_channel.queue_bind(exchange=MARKETING_EXCHANGE, queue=promo_queue_name, routing_key=f'promotions')
-    consumer_channel.basic_consume(queue=promo_queue_name, on_message_callback=_handle_promotion, auto_ack=False)
+    pool.consume(promo_queue_name, pool.wrap("promotions", _handle_promotion), name="promotions")
+
+    pool.start_metrics()
+    consumer_pool = pool
+    promotion_queue = promo_queue_name
+    _sync_promotion_bindings()
 
     print("[Reservation MS] Aguardando atualizações de status e promoções do RabbitMQ...")
     consumer_channel.start_consuming()
@@ -133,12 +254,20 @@ consumer_thread.start()
 
 @app.route('/api/reserve/itineraries', methods=['GET'])
 def get_itineraries():
-    params = {k: v for k, v in locals().items() if v is not None and k in ['destination', 'boarding_date', 'boarding_port']}
-    
+    # Repassa filtros, intervalos, ordenação e paginação (limit/cursor) ao MS Itinerários
+    params = request.args.to_dict()
+    cache_key = tuple(sorted(params.items()))
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return jsonify(cached), 200
+
     try:
-        response = requests.get(f"{MS_ITINERARIES_URL}/itineraries", params=params)
+        since = search_cache.sequence()
+        response = http.get(f"{MS_ITINERARIES_URL}/itineraries", params=params)
         response.raise_for_status()
-        return jsonify(response.json()), response.status_code
+        result = response.json()
+        search_cache.put(cache_key, result, tags=_search_tags(params, result), since=since)
+        return jsonify(result), response.status_code
     except requests.exceptions.ConnectionError:
         return jsonify({"error": "Não foi possível conectar ao MS Itinerários. Ele está rodando?"}), 503
     except requests.exceptions.RequestException as e:
@@ -160,9 +289,7 @@ def make_reservation():
     
     print(f"[Reservation MS] Recebida solicitação de reserva: Itinerário ID: {itinerary_id}, Passageiros: {passengers}, Cliente ID: {client_id}")
     try:
-        itinerary_response = requests.get(f"{MS_ITINERARIES_URL}/itineraries?id={itinerary_id}")
-        itinerary_response.raise_for_status()
-        itinerary_details = itinerary_response.json()
+        itinerary_details = _get_itinerary(itinerary_id)
         if not itinerary_details:
             return jsonify({"error": "Itinerário não encontrado ou sem cabines disponíveis no MS Itinerários."}), 404
 
@@ -181,7 +308,7 @@ def make_reservation():
     total_price = itinerary_details['price'] * passengers
 
     reservation_data = {
-        "id": int(time.time()) + random.randint(1000, 9999),
+        "id": reservation_ids.next_id(),
         "itinerary_id": itinerary_id,
         "passengers": passengers,
         "total_price": total_price,
@@ -192,12 +319,13 @@ def make_reservation():
 
     print(f"[Reservation MS] Criando reserva: {reservation_data}")
 
-    reservations.append(reservation_data)
+    reservations.add(reservation_data)
 
     try:
-        publish_channel.basic_publish(
-            exchange='', routing_key=RESERVATION_CREATED_QUEUE,
-            body=json.dumps(reservation_data)
+        body, content_type = encode(reservation_data)
+        publisher.publish_and_wait(
+            exchange='', routing_key=RESERVATION_CREATED_QUEUE, body=body,
+            properties=Envelope(RESERVATION_CREATED, reservation_data['id'], client_id).properties(content_type)
         )
         print(f"[Reservation MS] Mensagem de reserva criada publicada para o itinerário {itinerary_id}.")
 
@@ -207,9 +335,10 @@ def make_reservation():
             "total_price": total_price, 
             "client_id": client_id,
             "currency": "BRL",
+            "reservation_id": reservation_data['id'],
         }
         print(f"[Reservation MS] Solicitando link de pagamento ao MS Pagamento para o itinerário {itinerary_id}.")
-        payment_response = requests.post(f"{MS_PAYMENT_URL}/payments/request-link", json=payment_request_payload)
+        payment_response = http.post(f"{MS_PAYMENT_URL}/payments/request-link", json=payment_request_payload)
         payment_response.raise_for_status()
 
         payment_data = payment_response.json()
@@ -227,7 +356,7 @@ def make_reservation():
             "sse_channel_for_status": _get_client_status_channel(client_id)
         }), 201
 
-    except pika.exceptions.AMQPConnectionError as e:
+    except pika.exceptions.AMQPError as e:
         print(f"[Reservation MS ERROR] Erro de conexão com RabbitMQ: {e}")
         return jsonify({"error": "Erro interno do servidor: Problema de conexão com RabbitMQ."}), 500
     except requests.exceptions.ConnectionError:
@@ -239,11 +368,40 @@ def make_reservation():
         print(f"[Reservation MS ERROR] Ocorreu um erro inesperado: {e}")
         return jsonify({"error": "Ocorreu um erro inesperado."}), 500
 
+@app.route('/api/reserve/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "itineraries": itinerary_cache.stats(),
+        "searches": search_cache.stats(),
+    }), 200
+
+@app.route('/api/reserve/consumer-stats', methods=['GET'])
+def consumer_stats():
+    if consumer_pool is None:
+        return jsonify({"error": "Consumidores RabbitMQ ainda não iniciados."}), 503
+    return jsonify(consumer_pool.stats()), 200
+
+@app.route('/api/reserve/publisher-stats', methods=['GET'])
+def publisher_stats():
+    return jsonify(publisher.stats()), 200
+
+@app.route('/api/reserve/tickets/<document_id>', methods=['GET'])
+def get_ticket_document(document_id):
+    # Documentos gerados pelo MS Bilhete, endereçados pelo SHA-256 do conteúdo;
+    # send_file transmite o arquivo em partes, sem carregá-lo inteiro na memória
+    try:
+        path = document_path(document_id)
+    except ValueError:
+        return jsonify({"error": "Bilhete inválido."}), 400
+    try:
+        return send_file(path, mimetype=DOCUMENT_MIMETYPE, conditional=True, etag=document_id, max_age=31536000)
+    except FileNotFoundError:
+        return jsonify({"error": "Bilhete não encontrado."}), 404
+
 @app.route('/api/reserve/list/<client_id>', methods=['GET'])
 def list_reservations(client_id):
     try:
-        reservations_for_client = [res for res in reservations if int(res['client_id']) == int(client_id)]
-        return jsonify(reservations_for_client), 200
+        return jsonify(reservations.list_for_client(client_id)), 200
     except Exception as e:
         print(f"[Reservation MS ERROR] Erro ao listar reservas: {e}")
         return jsonify({"error": "Ocorreu um erro ao listar reservas."}), 500
@@ -257,13 +415,17 @@ def cancel_reservation(reservation_id):
     }
     print(f"[Reservation MS] Recebida solicitação de cancelamento da reserva: {reservation_id}")
     try:
-        publish_channel.basic_publish(
-            exchange='', routing_key=RESERVATION_CANCELLED_QUEUE,
-            body=json.dumps(cancel_data)
+        reservation = reservations.get(int(reservation_id))
+        client_id = reservation["client_id"] if reservation is not None else None
+        body, content_type = encode(cancel_data)
+        publisher.publish_and_wait(
+            exchange='', routing_key=RESERVATION_CANCELLED_QUEUE, body=body,
+            properties=Envelope(RESERVATION_CANCELLED, int(reservation_id), client_id).properties(content_type)
         )
+        reservations.update_status(int(reservation_id), "cancelled")
         print(f"[Reservation MS] Mensagem de cancelamento da reserva {reservation_id} publicada.")
         return jsonify({"message": f"Solicitação de cancelamento da reserva {reservation_id} iniciada."}), 200
-    except pika.exceptions.AMQPConnectionError as e:
+    except pika.exceptions.AMQPError as e:
         print(f"[Reservation MS ERROR] Erro de conexão com RabbitMQ: {e}")
         return jsonify({"error": "Erro interno do servidor: Problema de conexão com RabbitMQ."}), 500
     except Exception as e:
@@ -272,30 +434,46 @@ def cancel_reservation(reservation_id):
 
 @app.route('/api/reserve/promotions/subscribe', methods=['POST'])
 def subscribe_to_promotions():
+    # "destinations" (opcional): lista de destinos; sem ela, todos os destinos
     data = request.get_json()
     if not data or 'client_id' not in data:
         return jsonify({"error": "client_id ausente"}), 400
-    
-    client_id = int(data['client_id'])
+    destinations = data.get('destinations')
+    if destinations is not None and not isinstance(destinations, list):
+        return jsonify({"error": "destinations deve ser uma lista"}), 400
 
-    if client_id not in promotion_subscribers:
-        promotion_subscribers.append(client_id)
-        print(f"[Reservation MS] Cliente {client_id} inscrito em promoções.")
+    client_id = int(data['client_id'])
+    subscribed = promotion_subscriptions.subscribe(client_id, destinations)
+    _request_promotion_bindings_sync()
+    print(f"[Reservation MS] Cliente {client_id} inscrito em promoções: {sorted(subscribed)}.")
 
-    return jsonify({"message": "Inscrito com sucesso em promoções.", "client_id": client_id}), 200
+    return jsonify({
+        "message": "Inscrito com sucesso em promoções.",
+        "client_id": client_id,
+        "destinations": sorted(subscribed),
+        "sse_channels": sorted(_get_destination_promo_channel(destination) for destination in subscribed),
+        "personal_sse_channel": _get_promo_channel(client_id)
+    }), 200
 
 @app.route('/api/reserve/promotions/unsubscribe', methods=['POST'])
 def unsubscribe_from_promotions():
+    # "destinations" (opcional): cancela só esses destinos; sem ela, todas as inscrições
     data = request.get_json()
     print(f"[Reservation MS] Recebida solicitação de cancelamento de inscrição em promoções: {data}")
     if not data or 'client_id' not in data:
         return jsonify({"error": "client_id ausente"}), 400
-    
+    destinations = data.get('destinations')
+    if destinations is not None and not isinstance(destinations, list):
+        return jsonify({"error": "destinations deve ser uma lista"}), 400
+
     client_id = int(data['client_id'])
-    if client_id in promotion_subscribers:
-        promotion_subscribers.remove(client_id)
+    if promotion_subscriptions.unsubscribe(client_id, destinations):
+        _request_promotion_bindings_sync()
         print(f"[Reservation MS] Cliente {client_id} cancelou a inscrição em promoções.")
-        return jsonify({"message": "Cancelamento de inscrição em promoções bem-sucedido."}), 200
+        return jsonify({
+            "message": "Cancelamento de inscrição em promoções bem-sucedido.",
+            "destinations": sorted(promotion_subscriptions.destinations_for(client_id))
+        }), 200
     else:
         print(f"[Reservation MS] Cliente {client_id} não estava inscrito em promoções.")
         return jsonify({"error": "Cliente não estava inscrito em promoções."}), 404
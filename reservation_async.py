@@ -0,0 +1,171 @@
+import asyncio
+from datetime import datetime
+import aio_pika
+import httpx
+from quart import Quart, request, jsonify
+
+from config import (
+    RABBITMQ_HOST, RESERVATION_CREATED_QUEUE,
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_SIZE
+)
+from http_client import CircuitBreaker, CircuitOpenError
+from id_generator import SnowflakeGenerator, node_id_from_env
+from reservation_store import create_reservation_store
+from codec import encode
+from messages import Envelope, RESERVATION_CREATED
+
+# Variante assíncrona (ASGI) da API de reservas do Reservation MS. Rode com:
+#   hypercorn reservation_async:app --bind 0.0.0.0:5004
+# Cada processo reivindica um node id livre neste host (id_generator.claim_node_id);
+# com processos em vários hosts, defina RESERVATION_NODE_ID em cada um.
+# Os status das reservas são atualizados pelo Reservation MS (reservation.py),
+# que consome as filas de status: aqui eles são lidos do mesmo banco SQLite.
+
+app = Quart(__name__)
+MS_ITINERARIES_URL = "http://localhost:5003"
+MS_PAYMENT_URL = "http://localhost:5001"
+
+reservations = create_reservation_store(shared=True)
+reservation_ids = SnowflakeGenerator(node_id_from_env())
+breakers = {"itineraries": CircuitBreaker(MS_ITINERARIES_URL), "payment": CircuitBreaker(MS_PAYMENT_URL)}
+
+def _get_client_status_channel(client_id):
+    return f"reservation-status-{client_id}"
+
+@app.before_serving
+async def _connect():
+    app.http = httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=HTTP_POOL_SIZE * 5, max_keepalive_connections=HTTP_POOL_SIZE)
+    )
+    app.amqp = await aio_pika.connect_robust(host=RABBITMQ_HOST)
+    app.publish_channel = await app.amqp.channel()
+    await app.publish_channel.declare_queue(RESERVATION_CREATED_QUEUE)
+
+@app.after_serving
+async def _disconnect():
+    await app.http.aclose()
+    await app.amqp.close()
+
+async def _call(service, method, url, **kwargs):
+    breaker = breakers[service]
+    breaker.before_request()
+    try:
+        response = await app.http.request(method, url, **kwargs)
+    except httpx.HTTPError:
+        breaker.record_failure()
+        raise
+    if response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    response.raise_for_status()
+    return response
+
+async def _publish_reservation_created(reservation_data):
+    envelope = Envelope(RESERVATION_CREATED, reservation_data["id"], reservation_data["client_id"])
+    body, content_type = encode(reservation_data)
+    await app.publish_channel.default_exchange.publish(
+        aio_pika.Message(
+            body=body, content_type=content_type,
+            type=envelope.type, correlation_id=envelope.correlation_id, headers=envelope.headers()
+        ),
+        routing_key=RESERVATION_CREATED_QUEUE
+    )
+    print(f"[Reservation MS async] Mensagem de reserva criada publicada para o itinerário {reservation_data['itinerary_id']}.")
+
+async def _request_payment_link(reservation_data):
+    payment_request_payload = {
+        "itinerary_id": reservation_data["itinerary_id"],
+        "passengers": reservation_data["passengers"],
+        "total_price": reservation_data["total_price"],
+        "client_id": reservation_data["client_id"],
+        "currency": "BRL",
+        "reservation_id": reservation_data["id"],
+    }
+    response = await _call("payment", "POST", f"{MS_PAYMENT_URL}/payments/request-link", json=payment_request_payload)
+    return response.json()
+
+@app.route('/api/reserve/itineraries', methods=['GET'])
+async def get_itineraries():
+    try:
+        response = await _call("itineraries", "GET", f"{MS_ITINERARIES_URL}/itineraries", params=request.args.to_dict())
+        return jsonify(response.json()), response.status_code
+    except (httpx.ConnectError, httpx.TimeoutException, CircuitOpenError):
+        return jsonify({"error": "Não foi possível conectar ao MS Itinerários. Ele está rodando?"}), 503
+    except httpx.HTTPError as e:
+        print(f"[Reservation MS async ERROR] Erro ao buscar itinerários: {e}")
+        return jsonify({"error": "Falha ao recuperar itinerários."}), 500
+
+@app.route('/api/reserve/new', methods=['POST'])
+async def make_reservation():
+    data = await request.get_json()
+    if not data:
+        return jsonify({"error": "JSON inválido"}), 400
+
+    itinerary_id = data.get('itinerary_id')
+    passengers = data.get('passengers')
+    client_id = int(data.get('client_id'))
+
+    if not all([itinerary_id, passengers, client_id]):
+        return jsonify({"error": "Dados ausentes: itinerary_id, passengers e client_id são obrigatórios"}), 400
+
+    try:
+        itinerary_response = await _call("itineraries", "GET", f"{MS_ITINERARIES_URL}/itineraries", params={"id": itinerary_id})
+        itinerary_details = itinerary_response.json()
+        if not itinerary_details:
+            return jsonify({"error": "Itinerário não encontrado ou sem cabines disponíveis no MS Itinerários."}), 404
+        if itinerary_details.get("available_cabins", 0) <= 0:
+            return jsonify({"error": "Itinerário sem cabines disponíveis."}), 409
+    except (httpx.ConnectError, httpx.TimeoutException, CircuitOpenError):
+        return jsonify({"error": "Não foi possível conectar ao MS Itinerários para obter detalhes. Ele está rodando?"}), 503
+    except httpx.HTTPError as e:
+        print(f"[Reservation MS async ERROR] Erro ao obter detalhes do itinerário do MS Itinerários: {e}")
+        return jsonify({"error": "Falha ao validar itinerário."}), 500
+
+    total_price = itinerary_details['price'] * passengers
+    reservation_data = {
+        "id": reservation_ids.next_id(),
+        "itinerary_id": itinerary_id,
+        "passengers": passengers,
+        "total_price": total_price,
+        "client_id": client_id,
+        "timestamp": datetime.now().isoformat(),
+        "status": "pending",
+    }
+    reservations.add(reservation_data)
+
+    # A publicação de reserva criada e o pedido de link de pagamento são
+    # independentes: rodam em paralelo.
+    published, payment = await asyncio.gather(
+        _publish_reservation_created(reservation_data),
+        _request_payment_link(reservation_data),
+        return_exceptions=True
+    )
+    if isinstance(published, Exception):
+        print(f"[Reservation MS async ERROR] Erro de conexão com RabbitMQ: {published}")
+        return jsonify({"error": "Erro interno do servidor: Problema de conexão com RabbitMQ."}), 500
+    if isinstance(payment, (httpx.ConnectError, httpx.TimeoutException, CircuitOpenError)):
+        return jsonify({"error": "Não foi possível conectar ao MS Pagamento. Ele está rodando?"}), 503
+    if isinstance(payment, Exception):
+        print(f"[Reservation MS async ERROR] Erro durante a solicitação de link de pagamento: {payment}")
+        return jsonify({"error": f"Falha ao obter link de pagamento: {payment}"}), 500
+
+    if not payment.get('payment_link'):
+        return jsonify({"error": "O MS Pagamento não retornou um link de pagamento."}), 500
+
+    return jsonify({
+        "message": "Reserva criada e link de pagamento solicitado.",
+        "reservation_id": reservation_data['id'],
+        "payment_link": payment['payment_link'],
+        "transaction_id": payment.get('transaction_id'),
+        "sse_channel_for_status": _get_client_status_channel(client_id)
+    }), 201
+
+@app.route('/api/reserve/list/<client_id>', methods=['GET'])
+async def list_reservations(client_id):
+    return jsonify(reservations.list_for_client(client_id)), 200
+
+if __name__ == '__main__':
+    print("[Reservation MS async] Iniciando aplicação ASGI na porta 5004...")
+    app.run(host='0.0.0.0', port=5004)
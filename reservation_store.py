@@ -0,0 +1,236 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from id_generator import id_range, id_timestamp
+from config import (
+    RESERVATION_STORE_BACKEND, RESERVATION_DB_FILE, RESERVATION_ARCHIVE_SIZE, RESERVATION_ACTIVE_MAX_AGE,
+    RESERVATION_WRITE_BATCH_SIZE, RESERVATION_WRITE_INTERVAL
+)
+
+TERMINAL_STATUSES = {"ticket_issued", "declined", "cancelled", "expired", "rejected"}
+# Status events arrive on separate queues, so out of order: any other change is ignored.
+# A payment approved after its hold expired may still take the cabins (Itinerary MS).
+ALLOWED_TRANSITIONS = {
+    "pending": {"approved", "declined", "cancelled", "expired", "rejected", "ticket_issued"},
+    "approved": {"ticket_issued", "cancelled", "rejected"},
+    "expired": {"approved", "ticket_issued", "rejected"},
+}
+
+class MemoryReservationStore:
+    """Reservations indexed by id and by client id.
+
+    Active reservations stay in memory. Once a reservation reaches a terminal
+    status, or is older than ``max_active_age`` seconds without reaching one
+    (e.g. a status event was lost), it moves to a bounded archive (oldest
+    dropped first), so memory does not grow with the total number of bookings.
+    """
+
+    def __init__(self, archive_size=RESERVATION_ARCHIVE_SIZE, max_active_age=RESERVATION_ACTIVE_MAX_AGE, clock=time.time):
+        self.archive_size = archive_size
+        self.max_active_age = max_active_age
+        self.clock = clock
+        self._lock = threading.RLock()
+        # Creation order: ids are time-ordered, so the oldest are at the front
+        self._active = OrderedDict()
+        self._archive = OrderedDict()
+        self._by_client = {}
+
+    def add(self, reservation):
+        with self._lock:
+            self._active[reservation["id"]] = reservation
+            self._by_client.setdefault(int(reservation["client_id"]), {})[reservation["id"]] = reservation
+            self._archive_aged()
+        self._write(reservation)
+
+    def get(self, reservation_id):
+        with self._lock:
+            return self._active.get(reservation_id) or self._archive.get(reservation_id)
+
+    def list_for_client(self, client_id):
+        with self._lock:
+            return list(self._by_client.get(int(client_id), {}).values())
+
+    def list_created_between(self, start, end):
+        """Reservations created between two Unix timestamps, read off the time-ordered ids."""
+        low, high = id_range(start, end)
+        with self._lock:
+            found = [r for id, r in list(self._active.items()) + list(self._archive.items()) if low <= id <= high]
+        return sorted(found, key=lambda r: r["id"])
+
+    def update_status(self, reservation_id, status):
+        """Move a reservation to ``status`` if ``ALLOWED_TRANSITIONS`` permits it; returns the reservation."""
+        with self._lock:
+            reservation = self.get(reservation_id)
+            if reservation is None:
+                return None
+            if status not in ALLOWED_TRANSITIONS.get(reservation["status"], ()):
+                return reservation
+            reservation["status"] = status
+            if status in TERMINAL_STATUSES and reservation_id in self._active:
+                self._archive_reservation(self._active.pop(reservation_id))
+        self._write(reservation)
+        return reservation
+
+    def _archive_aged(self):
+        cutoff = self.clock() - self.max_active_age
+        while self._active:
+            id = next(iter(self._active))
+            if id_timestamp(id) > cutoff:
+                break
+            self._archive_reservation(self._active.pop(id))
+
+    def _archive_reservation(self, reservation):
+        self._archive[reservation["id"]] = reservation
+        while len(self._archive) > self.archive_size:
+            _, evicted = self._archive.popitem(last=False)
+            client = self._by_client.get(int(evicted["client_id"]))
+            if client is not None:
+                client.pop(evicted["id"], None)
+                if not client:
+                    del self._by_client[int(evicted["client_id"])]
+
+    def _write(self, reservation):
+        pass
+
+class SQLiteReservationStore(MemoryReservationStore):
+    """Memory store backed by SQLite (WAL mode) for every reservation ever made.
+
+    Writes are queued and flushed by a background thread in batches of up to
+    ``batch_size`` rows or every ``interval`` seconds, and once more at exit.
+    Archived reservations
+    that were dropped from memory are still found through the database,
+    which is indexed by client id.
+
+    With ``shared=True`` another process (the Reservation MS) owns the
+    statuses: nothing is kept in memory and reads go to the database, plus
+    this process's writes that are not flushed yet.
+    """
+
+    COLUMNS = ("id", "itinerary_id", "passengers", "total_price", "client_id", "timestamp", "status")
+
+    def __init__(self, db_file=RESERVATION_DB_FILE, archive_size=RESERVATION_ARCHIVE_SIZE, max_active_age=RESERVATION_ACTIVE_MAX_AGE,
+                 batch_size=RESERVATION_WRITE_BATCH_SIZE, interval=RESERVATION_WRITE_INTERVAL, shared=False):
+        super().__init__(archive_size, max_active_age)
+        self.db_file = db_file
+        self.shared = shared
+        self.batch_size = batch_size
+        self.interval = interval
+        self._local = threading.local()
+        self._pending = {}
+        self._wakeup = threading.Condition(self._lock)
+        # Held for a whole flush, so the exit flush waits for a batch the writer thread is committing
+        self._flush_lock = threading.Lock()
+        if os.path.dirname(db_file):
+            os.makedirs(os.path.dirname(db_file), exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations ("
+            "id INTEGER PRIMARY KEY, itinerary_id INTEGER, passengers INTEGER, total_price REAL, "
+            "client_id INTEGER, timestamp TEXT, status TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS reservations_client ON reservations (client_id, id)")
+        conn.commit()
+        if not shared:
+            self._load_active(conn)
+        threading.Thread(target=self._writer, daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, reservation):
+        if self.shared:
+            self._write(reservation)
+        else:
+            super().add(reservation)
+
+    def get(self, reservation_id):
+        reservation = super().get(reservation_id)
+        if reservation is not None:
+            return reservation
+        with self._lock:
+            if reservation_id in self._pending:
+                return self._pending[reservation_id]
+        row = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM reservations WHERE id = ?", (reservation_id,)
+        ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def list_for_client(self, client_id):
+        rows = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM reservations WHERE client_id = ? ORDER BY id", (int(client_id),)
+        ).fetchall()
+        merged = {row[0]: dict(zip(self.COLUMNS, row)) for row in rows}
+        with self._lock:
+            merged.update((id, r) for id, r in self._pending.items() if int(r["client_id"]) == int(client_id))
+            merged.update((r["id"], r) for r in super().list_for_client(client_id))
+        return [merged[id] for id in sorted(merged)]
+
+    def list_created_between(self, start, end):
+        low, high = id_range(start, end)
+        rows = self._connection().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM reservations WHERE id BETWEEN ? AND ? ORDER BY id", (low, high)
+        ).fetchall()
+        merged = {row[0]: dict(zip(self.COLUMNS, row)) for row in rows}
+        merged.update((r["id"], r) for r in super().list_created_between(start, end))
+        with self._lock:
+            merged.update((id, r) for id, r in self._pending.items() if low <= id <= high)
+        return [merged[id] for id in sorted(merged)]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = list(self._pending.values()), {}
+            if batch:
+                conn = self._connection()
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO reservations ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    [tuple(r.get(column) for column in self.COLUMNS) for r in batch]
+                )
+                conn.commit()
+
+    def _write(self, reservation):
+        with self._lock:
+            self._pending[reservation["id"]] = dict(reservation)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+
+    def _writer(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(lambda: len(self._pending) >= self.batch_size, timeout=self.interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[Reservation Store ERROR] Failed to write reservations batch: {e}")
+
+    def _load_active(self, conn):
+        placeholders = ", ".join("?" * len(TERMINAL_STATUSES))
+        newest_aged = id_range(0, self.clock() - self.max_active_age)[1]
+        rows = conn.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM reservations WHERE status NOT IN ({placeholders}) AND id > ? ORDER BY id",
+            (*TERMINAL_STATUSES, newest_aged)
+        ).fetchall()
+        with self._lock:
+            for row in rows:
+                reservation = dict(zip(self.COLUMNS, row))
+                self._active[reservation["id"]] = reservation
+                self._by_client.setdefault(int(reservation["client_id"]), {})[reservation["id"]] = reservation
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_file)
+        return conn
+
+def create_reservation_store(backend=RESERVATION_STORE_BACKEND, shared=False):
+    """``shared`` stores read statuses updated by another process, which needs the sqlite backend."""
+    if backend == "memory":
+        if shared:
+            raise ValueError('A shared reservation store needs RESERVATION_STORE_BACKEND = "sqlite"')
+        return MemoryReservationStore()
+    if backend == "sqlite":
+        return SQLiteReservationStore(shared=shared)
+    raise ValueError(f"Unknown reservation store backend: {backend}")
@@ -1,42 +1,87 @@
-import time
-import pika
 import threading
-from config import ITINERARIES_FILE, MARKETING_EXCHANGE
+import pika
+from config import ITINERARIES_FILE, MARKETING_EXCHANGE, RABBITMQ_HOST
 from utils import load_itineraries
+from messages import promotion_routing_key
+
+class PromotionSubscriber:
+    """All destination subscriptions over one connection, one exclusive queue
+    and one consumer thread.
+
+    Subscribing adds a binding and a handler to the dispatch table (keyed by
+    routing key) at runtime; bindings are changed on the connection thread
+    through ``add_callback_threadsafe``, so callers never block on I/O.
+    """
+
+    def __init__(self, host=RABBITMQ_HOST):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host))
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='topic')
+        self.queue = self.channel.queue_declare(queue='', exclusive=True).method.queue
+        self.handlers = {}
+        self.channel.basic_consume(queue=self.queue, on_message_callback=self._dispatch, auto_ack=True)
+        threading.Thread(target=self.channel.start_consuming, daemon=True).start()
+
+    def subscribe(self, destination, handler):
+        routing_key = promotion_routing_key(destination)
+        def bind():
+            self.channel.queue_bind(exchange=MARKETING_EXCHANGE, queue=self.queue, routing_key=routing_key)
+            self.handlers[routing_key] = handler
+        self.connection.add_callback_threadsafe(bind)
+
+    def unsubscribe(self, destination):
+        routing_key = promotion_routing_key(destination)
+        def unbind():
+            self.channel.queue_unbind(exchange=MARKETING_EXCHANGE, queue=self.queue, routing_key=routing_key)
+            self.handlers.pop(routing_key, None)
+        self.connection.add_callback_threadsafe(unbind)
 
-itineraries = load_itineraries(ITINERARIES_FILE)
-
-print("Available itineraries:")
-for itinerary in itineraries.values():
-    print(f"    {itinerary['id']}. {itinerary['destination']} - {itinerary['ship']} - {itinerary['departure']} - {itinerary['price']} - {itinerary['departurePort']}")
-
-def subscribe_to_promotion(destination):
-    conn = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-    ch = conn.channel()
-    ch.exchange_declare(exchange=MARKETING_EXCHANGE, exchange_type='direct')
-    queue = ch.queue_declare(queue='', exclusive=True).method.queue
-    ch.queue_bind(exchange=MARKETING_EXCHANGE, queue=queue, routing_key=f'promotions-{destination.lower()}')
-    ch.basic_consume(queue=queue, on_message_callback=lambda ch, method, props, body: print(f"[Promotion] {body.decode()}"), auto_ack=True)
-    print(f"[Subscriber] Subscribed to promotions for {destination}. Waiting for messages...")
-    ch.start_consuming()
-
-past_choices = []
-while True:
-    choice = input("Enter the id of the itinerary you want to receive promotions for (or type 'done' to exit): ")
-    if choice.lower() == 'done':
-        print("Exiting...")
-        break
-    try:
-        choice = int(choice)
-        if choice not in itineraries:
+    def close(self):
+        self.connection.add_callback_threadsafe(self.connection.close)
+
+    def _dispatch(self, ch, method, properties, body):
+        handler = self.handlers.get(method.routing_key)
+        if handler is not None:
+            handler(body.decode())
+
+def print_promotion(destination):
+    return lambda message: print(f"[Promotion] [{destination}] {message}")
+
+if __name__ == '__main__':
+    itineraries = load_itineraries(ITINERARIES_FILE)
+
+    print("Available itineraries:")
+    for itinerary in itineraries.values():
+        print(f"    {itinerary['id']}. {itinerary['destination']} - {itinerary['ship']} - {itinerary['departure']} - {itinerary['price']} - {itinerary['departurePort']}")
+
+    subscriber = PromotionSubscriber()
+    subscribed = set()
+    while True:
+        choice = input("Enter the id of the itinerary you want to receive promotions for, -id to stop (or type 'done' to exit): ")
+        if choice.lower() == 'done':
+            print("Exiting...")
+            subscriber.close()
+            break
+        try:
+            itinerary_id = int(choice)
+        except ValueError:
+            print("Invalid input. Please enter a valid itinerary id or 'done'.")
+            continue
+        if abs(itinerary_id) not in itineraries:
             print("Invalid choice. Please try again.")
             continue
-        if choice in past_choices:
-            print("You have already subscribed to this itinerary.")
+        destination = itineraries[abs(itinerary_id)]['destination']
+        if itinerary_id < 0:
+            if destination not in subscribed:
+                print(f"You are not subscribed to {destination}.")
+                continue
+            subscribed.discard(destination)
+            subscriber.unsubscribe(destination)
+            print(f"[Subscriber] Unsubscribed from promotions for {destination}.")
+            continue
+        if destination in subscribed:
+            print(f"You have already subscribed to {destination}.")
             continue
-        past_choices.append(choice)
-        destination = itineraries[choice]['destination']
-        threading.Thread(target=subscribe_to_promotion, args=(destination,), daemon=True).start()
-        time.sleep(5)
-    except ValueError:
-        print("Invalid input. Please enter a valid itinerary id or 'done'.")
+        subscribed.add(destination)
+        subscriber.subscribe(destination, print_promotion(destination))
+        print(f"[Subscriber] Subscribed to promotions for {destination}.")
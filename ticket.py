@@ -1,27 +1,167 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-import pika, json
-from config import PAYMENT_APPROVED_QUEUE, TICKET_ISSUED_QUEUE, PAYMENT_PUBLIC_KEY_FILE, PAYMENT_EXCHANGE, TICKET_EXCHANGE
-from utils import verify_signature
+import pika
+from config import (
+    PAYMENT_APPROVED_QUEUE, PAYMENT_APPROVED_TICKED_QUEUE, TICKET_ISSUED_QUEUE, PAYMENT_EXCHANGE, TICKET_EXCHANGE,
+    RABBITMQ_HOST, TICKET_PREFETCH, TICKET_WORKERS, TICKET_REPORT_INTERVAL, TICKET_RENDER_WORKERS, ITINERARIES_FILE
+)
+from codec import encode, decode_message
+from messages import Envelope, PAYMENT_APPROVED, TICKET_ISSUED
+from publisher import Publisher
+from verification import BatchVerifier, verify_payment_message
+from ticket_render import render_and_store
+from utils import load_itineraries
 
-conn = pika.BlockingConnection(pika.ConnectionParameters('localhost'))
-ch = conn.channel()
-ch.exchange_declare(exchange=TICKET_EXCHANGE, exchange_type='direct')
-
-def createTicket(ch, method, properties, body):
-    data = json.loads(body)
-    print(method.routing_key)
-    ch.basic_publish(exchange=TICKET_EXCHANGE, routing_key=TICKET_ISSUED_QUEUE, body=json.dumps(create_message(data['message'])))
-    print(f"[Ticket] [{datetime.now().isoformat()}] " + data['message'])
-
-def create_message(message):
+def create_message(message, reservation_id=None, document_id=None):
     return {
         "timestamp": datetime.now().isoformat(),
         "status": "Ticket Issued",
-        "details": message
+        "details": message,
+        "reservation_id": reservation_id,
+        "document_id": document_id
+    }
+
+def create_ticket(data, itineraries):
+    itinerary_id = data.get("itinerary_id")
+    return {
+        "reservation_id": data.get("reservation_id"),
+        "client_id": data.get("client_id"),
+        "passengers": [f"Passenger {i}" for i in range(1, int(data.get("passengers") or 1) + 1)],
+        "itinerary": itineraries.get(int(itinerary_id)) if itinerary_id is not None else None,
     }
 
-ch.queue_declare(queue=PAYMENT_APPROVED_QUEUE)
-ch.queue_bind(exchange=PAYMENT_EXCHANGE, queue=PAYMENT_APPROVED_QUEUE, routing_key=PAYMENT_APPROVED_QUEUE)
-ch.basic_consume(queue=PAYMENT_APPROVED_QUEUE, on_message_callback=createTicket, auto_ack=True)
-print("[Ticket] Waiting for payment confirmations...")
-ch.start_consuming()
+class TicketService:
+    """Issues a ticket event for every approved payment.
+
+    Approvals are prefetched and their signatures verified in batches
+    (BatchVerifier). The boarding document is rendered and stored by content
+    hash on a process pool (ticket_render.py), then the ticket event is
+    published through the Publisher in confirm mode. A payment approval is
+    acked only once its ticket event is confirmed by the broker, so a crash
+    at any point redelivers it instead of losing the ticket. Only approvals
+    that can't be decoded or rendered are rejected. A broken render pool
+    (which is then replaced), storage errors and publish failures requeue
+    them.
+    """
+
+    def __init__(self, prefetch=TICKET_PREFETCH, workers=TICKET_WORKERS):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(RABBITMQ_HOST))
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange=PAYMENT_EXCHANGE, exchange_type='direct')
+        # Own queue: payment-approved is consumed by the Reservation MS
+        self.channel.queue_declare(queue=PAYMENT_APPROVED_TICKED_QUEUE)
+        self.channel.queue_bind(exchange=PAYMENT_EXCHANGE, queue=PAYMENT_APPROVED_TICKED_QUEUE, routing_key=PAYMENT_APPROVED_QUEUE)
+        self.channel.basic_qos(prefetch_count=prefetch)
+
+        self.publisher = Publisher(setup=lambda channel: channel.exchange_declare(exchange=TICKET_EXCHANGE, exchange_type='direct'))
+        self.workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ticket")
+        self.renderer = ProcessPoolExecutor(max_workers=TICKET_RENDER_WORKERS)
+        self._renderer_lock = threading.Lock()
+        self.itineraries = load_itineraries(ITINERARIES_FILE)
+        self.verifier = BatchVerifier(self.connection)
+        self.issued = 0
+        self.failed = 0
+        self.retried = 0
+
+    def run(self):
+        self.channel.basic_consume(
+            queue=PAYMENT_APPROVED_TICKED_QUEUE,
+            on_message_callback=self.verifier.wrap(PAYMENT_APPROVED_TICKED_QUEUE, verify_payment_message, self._on_verified, ack=False),
+            auto_ack=False
+        )
+        self._schedule_report()
+        print("[Ticket] Waiting for payment confirmations...")
+        self.channel.start_consuming()
+
+    def _on_verified(self, ch, method, properties, body):
+        self.workers.submit(self._issue, method.delivery_tag, properties, body)
+
+    def _issue(self, delivery_tag, properties, body):
+        try:
+            data = decode_message(properties, body)
+            envelope = Envelope.from_properties(properties, data, PAYMENT_APPROVED).reply(TICKET_ISSUED)
+            details = data["message"]
+            ticket = create_ticket({**data, "reservation_id": envelope.reservation_id}, self.itineraries)
+        except Exception as e:
+            # Malformed approval: redelivering it would fail the same way
+            self._failed(delivery_tag, e)
+            return
+        renderer = self.renderer
+        try:
+            rendered = renderer.submit(render_and_store, ticket)
+        except Exception as e:
+            self._retry(delivery_tag, e, renderer)
+            return
+        rendered.add_done_callback(lambda f: self._publish_ticket(delivery_tag, envelope, details, f, renderer))
+
+    def _publish_ticket(self, delivery_tag, envelope, details, rendered, renderer):
+        try:
+            document_id = rendered.result()
+        except (BrokenProcessPool, OSError) as e:
+            self._retry(delivery_tag, e, renderer)
+            return
+        except Exception as e:
+            # The ticket itself can't be rendered: a redelivery would fail the same way
+            self._failed(delivery_tag, e)
+            return
+        try:
+            ticket_body, content_type = encode(create_message(details, envelope.reservation_id, document_id))
+            future = self.publisher.publish(TICKET_EXCHANGE, TICKET_ISSUED_QUEUE, ticket_body, envelope.properties(content_type))
+        except Exception as e:
+            self._retry(delivery_tag, e, renderer)
+            return
+        future.add_done_callback(lambda f: self.connection.add_callback_threadsafe(lambda: self._settle(delivery_tag, f)))
+
+    def _failed(self, delivery_tag, error):
+        print(f"[Ticket ERROR] Could not issue ticket for message {delivery_tag}: {error}")
+        self.connection.add_callback_threadsafe(lambda: self._reject(delivery_tag))
+
+    def _retry(self, delivery_tag, error, renderer):
+        # Render pool, disk or publisher trouble is transient: requeue the approval
+        print(f"[Ticket ERROR] Could not issue ticket for message {delivery_tag}, requeueing: {error}")
+        if isinstance(error, BrokenProcessPool):
+            self._replace_renderer(renderer)
+        self.connection.add_callback_threadsafe(lambda: self._requeue(delivery_tag))
+
+    def _replace_renderer(self, broken):
+        # Every task of a broken pool fails: only the first failure replaces it
+        with self._renderer_lock:
+            if self.renderer is broken:
+                self.renderer = ProcessPoolExecutor(max_workers=TICKET_RENDER_WORKERS)
+                broken.shutdown(wait=False)
+                print("[Ticket] Render pool was broken and has been replaced.")
+
+    def _settle(self, delivery_tag, future):
+        error = future.exception()
+        if error is None:
+            self.issued += 1
+            self.channel.basic_ack(delivery_tag)
+        else:
+            print(f"[Ticket ERROR] Ticket event for message {delivery_tag} not confirmed, requeueing: {error}")
+            self.channel.basic_nack(delivery_tag, requeue=True)
+
+    def _reject(self, delivery_tag):
+        self.failed += 1
+        self.channel.basic_reject(delivery_tag, requeue=False)
+
+    def _requeue(self, delivery_tag):
+        self.retried += 1
+        self.channel.basic_nack(delivery_tag, requeue=True)
+
+    def _schedule_report(self):
+        # Counters are captured now: the lambda runs when the timer fires
+        issued, now = self.issued, time.monotonic()
+        self.connection.call_later(TICKET_REPORT_INTERVAL, lambda: self._report(issued, now))
+
+    def _report(self, last_issued, last_time):
+        now = time.monotonic()
+        if self.issued != last_issued:
+            rate = (self.issued - last_issued) / (now - last_time)
+            print(f"[Ticket] [{datetime.now().isoformat()}] {self.issued} tickets issued ({rate:,.0f}/s), {self.failed} failed, {self.retried} requeued")
+        self._schedule_report()
+
+if __name__ == '__main__':
+    TicketService().run()
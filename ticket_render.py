@@ -0,0 +1,79 @@
+import hashlib
+import html
+import os
+import re
+import tempfile
+from config import TICKET_DOCUMENTS_DIR
+
+DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+DOCUMENT_MIMETYPE = "text/html"
+BAR_WIDTH = 2
+
+def barcode_payload(ticket):
+    itinerary = ticket.get("itinerary") or {}
+    return f"TKT|{ticket.get('reservation_id')}|{itinerary.get('id')}|{ticket.get('client_id')}|{len(ticket['passengers'])}"
+
+def _barcode_svg(payload):
+    # Every bit of the payload becomes a narrow (0) or wide (1) bar
+    bars, x = [], 0
+    for byte in payload.encode():
+        for bit in range(7, -1, -1):
+            width = BAR_WIDTH * (2 if byte >> bit & 1 else 1)
+            bars.append(f'<rect x="{x}" y="0" width="{width}" height="60"/>')
+            x += width + BAR_WIDTH
+    return f'<svg xmlns="http://www.w3.org/2000/svg" width="{x}" height="60">{"".join(bars)}</svg>'
+
+def render_ticket(ticket):
+    """Boarding document (HTML) for a ticket dict with ``reservation_id``,
+    ``client_id``, ``passengers`` (names) and ``itinerary`` (catalog entry).
+
+    The output depends only on the ticket, so rendering the same ticket
+    again gives the same bytes.
+    """
+    itinerary = ticket.get("itinerary") or {}
+    payload = barcode_payload(ticket)
+    passengers = "".join(f"<li>{html.escape(name)}</li>" for name in ticket["passengers"])
+    stops = ", ".join(html.escape(stop) for stop in itinerary.get("stops", []))
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+        f"<title>Boarding document - reservation {ticket.get('reservation_id')}</title></head><body>"
+        f"<h1>Boarding document</h1>"
+        f"<p>Reservation {ticket.get('reservation_id')} - client {ticket.get('client_id')}</p>"
+        f"<h2>{html.escape(str(itinerary.get('destination', 'Unknown itinerary')))}</h2>"
+        f"<p>Ship: {html.escape(str(itinerary.get('ship', '-')))}<br>"
+        f"Boarding port: {html.escape(str(itinerary.get('departurePort', '-')))}<br>"
+        f"Departure: {html.escape(str(itinerary.get('departure', '-')))}<br>"
+        f"Nights: {itinerary.get('nights', '-')}<br>"
+        f"Stops: {stops or '-'}</p>"
+        f"<h2>Passengers</h2><ol>{passengers}</ol>"
+        f"{_barcode_svg(payload)}<p><code>{html.escape(payload)}</code></p>"
+        "</body></html>"
+    ).encode()
+
+def document_path(document_id, directory=TICKET_DOCUMENTS_DIR):
+    if not DOCUMENT_ID.match(document_id):
+        raise ValueError(f"Invalid document id: {document_id}")
+    return os.path.join(directory, document_id[:2], document_id)
+
+def store_document(content, directory=TICKET_DOCUMENTS_DIR):
+    """Write ``content`` under its SHA-256; an existing copy is kept as is."""
+    document_id = hashlib.sha256(content).hexdigest()
+    path = document_path(document_id, directory)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+    return document_id
+
+def render_and_store(ticket, directory=TICKET_DOCUMENTS_DIR):
+    """Process pool entry point: render and store a ticket, return its document id."""
+    return store_document(render_ticket(ticket), directory)
@@ -0,0 +1,86 @@
+import time
+
+class TimingWheel:
+    """Hierarchical timing wheel for large numbers of timeouts.
+
+    Level 0 has ``slots`` buckets of one ``tick`` each; every higher level
+    has ``slots`` buckets covering ``slots`` times the span of the level
+    below. A timer lives in the coarsest bucket that still tells it apart
+    from "now" and is cascaded down when its bucket comes up, so schedule
+    and cancel are O(1) and each tick only touches one bucket per level.
+    Not thread-safe: schedule, cancel and advance from one thread.
+    """
+
+    def __init__(self, tick=1.0, slots=64, levels=4, clock=time.monotonic):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.clock = clock
+        self.current_tick = int(clock() / tick)
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._timers = {}
+
+    def __len__(self):
+        return len(self._timers)
+
+    def __contains__(self, key):
+        return key in self._timers
+
+    def schedule(self, key, delay):
+        """(Re)arm a timer for ``key`` that fires ``delay`` seconds from now."""
+        self.cancel(key)
+        expires = max(int((self.clock() + delay) / self.tick), self.current_tick + 1)
+        self._insert(key, expires)
+
+    def cancel(self, key):
+        location = self._timers.pop(key, None)
+        if location is None:
+            return False
+        level, slot = location
+        del self._wheels[level][slot][key]
+        return True
+
+    def advance(self):
+        """Move the wheel up to the current time; return the keys that expired."""
+        expired = []
+        now = int(self.clock() / self.tick)
+        while self.current_tick < now:
+            self.current_tick += 1
+            self._cascade()
+            bucket = self._wheels[0][self.current_tick % self.slots]
+            if bucket:
+                self._wheels[0][self.current_tick % self.slots] = {}
+                for key in bucket:
+                    del self._timers[key]
+                expired.extend(bucket)
+        return expired
+
+    def _insert(self, key, expires):
+        delta = expires - self.current_tick
+        width = 1
+        for level in range(self.levels):
+            if delta < width * self.slots or level == self.levels - 1:
+                # Timers beyond the top level's range park in its last bucket
+                # and get re-inserted each time that bucket comes up.
+                target = self.current_tick + min(delta, width * self.slots - 1)
+                slot = target // width % self.slots
+                self._wheels[level][slot][key] = expires
+                self._timers[key] = (level, slot)
+                return
+            width *= self.slots
+
+    def _cascade(self):
+        # When level 0 wraps, the current bucket of the level above comes due
+        # (and so on upwards): re-insert those timers, coarsest level first,
+        # so they land in finer buckets.
+        due = 0
+        while due + 1 < self.levels and self.current_tick % self.slots ** (due + 1) == 0:
+            due += 1
+        for level in range(due, 0, -1):
+            slot = self.current_tick // self.slots ** level % self.slots
+            bucket = self._wheels[level][slot]
+            if bucket:
+                self._wheels[level][slot] = {}
+                for key, expires in bucket.items():
+                    del self._timers[key]
+                    self._insert(key, expires)
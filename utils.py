@@ -1,9 +1,10 @@
 from collections import namedtuple
 from datetime import datetime
-from cryptography.hazmat.primitives import serialization, hashes
-from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, ed25519
 import json, pika
-from config import RABBITMQ_HOST
+from config import RABBITMQ_HOST, RSA_SIGNATURE_ALGORITHM, ED25519_SIGNATURE_ALGORITHM
+from key_registry import registry
 
 PaymentRequest = namedtuple('PaymentRequest', ['itinerary_id', 'passengers', 'total_price', 'client_id', 'currency'])
 
@@ -24,25 +25,44 @@ def load_itineraries(file_name):
         itineraries = {itinerary["id"]: itinerary for itinerary in json.load(f)}
     return itineraries
 
+def signature_algorithm(key):
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return ED25519_SIGNATURE_ALGORITHM
+    return RSA_SIGNATURE_ALGORITHM
+
+def sign_bytes(data, private_key):
+    if signature_algorithm(private_key) == ED25519_SIGNATURE_ALGORITHM:
+        return private_key.sign(data)
+    return private_key.sign(data, padding.PKCS1v15(), hashes.SHA256())
+
+def verify_bytes(data, signature, pub_key):
+    if signature_algorithm(pub_key) == ED25519_SIGNATURE_ALGORITHM:
+        pub_key.verify(signature, data)
+    else:
+        pub_key.verify(signature, data, padding.PKCS1v15(), hashes.SHA256())
+
 def sign_message(message, file_name):
-    private_key = serialization.load_pem_private_key(open(file_name, "rb").read(), password=None)
-    return private_key.sign(
-        message.encode(),
-        padding.PKCS1v15(),
-        hashes.SHA256()
-    ).hex()
+    return sign_bytes(message.encode(), registry.private_key(file_name)).hex()
 
-def verify_signature(message, signature, pub_key_path):
-    with open(pub_key_path, "rb") as f:
-        pub_key = serialization.load_pem_public_key(f.read())
+def create_signed_message(message, file_name):
+    private_key, key_id = registry.signing_key(file_name)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "message": message,
+        "key_id": key_id,
+        "algorithm": signature_algorithm(private_key),
+        "signature": sign_bytes(message.encode(), private_key).hex()
+    }
 
+def verify_signature(message, signature, pub_key_path, key_id=None, algorithm=RSA_SIGNATURE_ALGORITHM):
     try:
-        pub_key.verify(
-            bytes.fromhex(signature),
-            message.encode(),
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
+        if key_id:
+            pub_key = registry.public_key_by_id(key_id, pub_key_path)
+        else:
+            pub_key = registry.public_key(pub_key_path)
+        if signature_algorithm(pub_key) != (algorithm or RSA_SIGNATURE_ALGORITHM):
+            return False
+        verify_bytes(message.encode(), bytes.fromhex(signature), pub_key)
         return True
     except:
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,124 @@
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import PAYMENT_PUBLIC_KEY_FILE, VERIFY_BATCH_SIZE, VERIFY_BATCH_MAX_WAIT, VERIFY_WORKERS
+from utils import verify_signature
+from codec import decode
+from key_registry import registry
+
+def payment_public_keys():
+    return registry.public_keys(PAYMENT_PUBLIC_KEY_FILE)
+
+def verify_payment_message(body, content_type=None):
+    data = decode(body, content_type)
+    return verify_signature(data["message"], data["signature"], PAYMENT_PUBLIC_KEY_FILE, data.get("key_id"), data.get("algorithm"))
+
+def verify_all(verify_fn, messages, public_keys=None):
+    # Workers start lazily, possibly after a rotation: learn the keys the parent has seen
+    if public_keys:
+        registry.add_public_keys(public_keys)
+    results = []
+    for body, content_type in messages:
+        try:
+            results.append(verify_fn(body, content_type))
+        except Exception:
+            results.append(False)
+    return results
+
+class _Batch:
+    def __init__(self, deliveries):
+        self.deliveries = deliveries
+        self.results = [None] * len(deliveries)
+        self.pending = 0
+        self.done = False
+
+class BatchVerifier:
+    """Verification stage between a pika consumer and its handlers.
+
+    Deliveries are buffered per queue until ``batch_size`` messages arrive or
+    ``max_wait`` seconds pass, then verified in chunks on a worker pool. Results
+    come back to the connection thread through ``add_callback_threadsafe``;
+    valid messages are handed to their handler and acked, invalid ones are
+    rejected. Batches of the same queue complete in delivery order. With
+    ``ack=False`` the handler acks valid messages itself (e.g. after handing
+    them to a ConsumerPool). The public keys this process knows
+    (``public_keys()``, loaded once at start) go with every chunk, so keys
+    rotated away after a worker process started still verify in it.
+    """
+
+    def __init__(self, connection, batch_size=VERIFY_BATCH_SIZE, max_wait=VERIFY_BATCH_MAX_WAIT, workers=VERIFY_WORKERS, executor=None,
+                 public_keys=payment_public_keys):
+        self.connection = connection
+        self.public_keys = public_keys
+        public_keys()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.workers = workers
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._in_flight = {}
+        self._timers = {}
+
+    def wrap(self, queue, verify_fn, handler, ack=True):
+        def on_message(ch, method, properties, body):
+            self._buffers.setdefault(queue, []).append((ch, method, properties, body, handler, ack))
+            if len(self._buffers[queue]) >= self.batch_size:
+                self._flush(queue, verify_fn)
+            elif queue not in self._timers:
+                self._timers[queue] = self.connection.call_later(self.max_wait, lambda: self._flush(queue, verify_fn))
+        return on_message
+
+    def _flush(self, queue, verify_fn):
+        timer = self._timers.pop(queue, None)
+        if timer is not None:
+            self.connection.remove_timeout(timer)
+        deliveries = self._buffers.pop(queue, [])
+        if not deliveries:
+            return
+
+        batch = _Batch(deliveries)
+        self._in_flight.setdefault(queue, deque()).append(batch)
+        chunk_size = max(1, -(-len(deliveries) // self.workers))
+        chunks = [
+            (start, [(d[3], d[2].content_type) for d in deliveries[start:start + chunk_size]])
+            for start in range(0, len(deliveries), chunk_size)
+        ]
+        batch.pending = len(chunks)
+        public_keys = self.public_keys()
+        for start, messages in chunks:
+            future = self.executor.submit(verify_all, verify_fn, messages, public_keys)
+            future.add_done_callback(lambda f, start=start, count=len(messages): self._on_chunk_done(queue, batch, start, count, f))
+
+    def _on_chunk_done(self, queue, batch, start, count, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            print(f"[Verification ERROR] Failed to verify batch from queue '{queue}': {e}")
+            results = [False] * count
+        with self._lock:
+            batch.results[start:start + count] = results
+            batch.pending -= 1
+            finished = batch.pending == 0
+        if finished:
+            self.connection.add_callback_threadsafe(lambda: self._complete(queue, batch))
+
+    def _complete(self, queue, batch):
+        batch.done = True
+        in_flight = self._in_flight[queue]
+        while in_flight and in_flight[0].done:
+            self._dispatch(in_flight.popleft())
+
+    def _dispatch(self, batch):
+        for (ch, method, properties, body, handler, ack), valid in zip(batch.deliveries, batch.results):
+            if not valid:
+                print(f"[Verification] Invalid signature on message {method.delivery_tag}. Rejecting.")
+                ch.basic_reject(method.delivery_tag, requeue=False)
+                continue
+            try:
+                handler(ch, method, properties, body)
+                if ack:
+                    ch.basic_ack(method.delivery_tag)
+            except Exception as e:
+                print(f"[Verification ERROR] Handler failed for message {method.delivery_tag}: {e}")
+                ch.basic_reject(method.delivery_tag, requeue=False)